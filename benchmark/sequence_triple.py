@@ -0,0 +1,171 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__doc__ = """
+Usage:
+    {f} [-r | --repeat <repeat>] [-s | --seed <seed>] [<size>...]
+    {f} -h | --help
+
+Options:
+    -r --repeat=<repeat>        number of decodes per size  [default: 5]
+    -s --seed=<seed>            random seed                 [default: 0]
+    -h --help                   show this screen
+""".format(f=__file__)
+
+
+import os
+import sys
+import time
+import random
+from docopt import docopt
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from tqec_optimizer.vector3d import Vector3D
+from tqec_optimizer.transformation.loop import Loop
+from tqec_optimizer.relocation.module_factory import ModuleFactory
+from tqec_optimizer.relocation.sequence_triple import SequenceTriple
+
+
+def main():
+    """
+    Sequence-Tripleの座標計算を従来の実装と比較する
+    """
+    args = docopt(__doc__)
+    repeat = int(args['--repeat'][0])
+    random.seed(int(args['--seed'][0]))
+    size_list = [int(size) for size in args['<size>']] or [50, 200, 1000]
+
+    print("modules  current[s]  new[s]  speedup")
+    for size in size_list:
+        module_list = create_module_list(size)
+        module_map = {module_.id: module_ for module_ in module_list}
+        place = SequenceTriple(module_list)
+        place.build_permutation()
+
+        current_time, new_time = 0.0, 0.0
+        for n in range(0, repeat):
+            for m in range(0, size):
+                place.create_neighborhood()
+            p1, p2, p3 = place.candidate_permutation
+
+            start = time.time()
+            place.recalculate_coordinate()
+            new_time += time.time() - start
+            new_pos_list = [position(module_) for module_ in module_list]
+
+            start = time.time()
+            decode(module_map, p1, p2, p3)
+            current_time += time.time() - start
+            current_pos_list = [position(module_) for module_ in module_list]
+
+            if new_pos_list != current_pos_list:
+                print("mismatch at {} modules".format(size))
+                sys.exit(1)
+
+        print("{:7d}  {:10.4f}  {:6.4f}  {:7.1f}".format(size, current_time / repeat, new_time / repeat,
+                                                       current_time / new_time))
+
+
+def create_module_list(size):
+    module_list = []
+    for id_ in range(1, size + 1):
+        loop = Loop(id_)
+        for n in range(0, random.randint(1, 4)):
+            loop.add_cross(random.randint(1, size))
+        module_list.append(ModuleFactory("primal", loop, []).create())
+
+    new_pos = Vector3D(0, 0, 0)
+    for module_ in module_list:
+        module_.set_position(Vector3D(new_pos.x, new_pos.y, new_pos.z), True)
+        new_pos.incz(module_.depth)
+
+    return module_list
+
+
+def position(module_):
+    return module_.pos.x, module_.pos.y, module_.pos.z, module_.width, module_.height, module_.depth
+
+
+def decode(module_map, p1, p2, p3):
+    """
+    従来の実装による座標計算
+    各モジュールについて順列を走査し, 配置済みのモジュールの集合の積を取る
+    (モジュール番号で引く配置済みフラグの配列は集合に置き換えている)
+    """
+    placed = set()
+    for id_ in p3:
+        new_pos = Vector3D(find_x(module_map, placed, id_, p2),
+                           find_y(module_map, placed, id_, p1, p2),
+                           find_z(module_map, placed, id_, p1, p2))
+        module_map[id_].set_position(new_pos, True)
+        placed.add(id_)
+
+
+def find_x(module_map, placed, target_id, p2):
+    p2_list = set()
+    flag = False
+    for id_ in p2:
+        if id_ == target_id:
+            flag = True
+        if not flag:
+            continue
+        if id_ in placed:
+            p2_list.add(id_)
+
+    x = 0
+    for id_ in p2_list:
+        x = max(x, module_map[id_].pos.x + module_map[id_].width)
+
+    return x
+
+
+def find_y(module_map, placed, target_id, p1, p2):
+    p1_list = set()
+    p2_list = set()
+    flag = False
+    for id_ in p1:
+        if id_ == target_id:
+            flag = True
+        if not flag:
+            continue
+        if id_ in placed:
+            p1_list.add(id_)
+
+    for id_ in p2:
+        if id_ == target_id:
+            break
+        if id_ in placed:
+            p2_list.add(id_)
+
+    y = 0
+    for id_ in p1_list & p2_list:
+        y = max(y, module_map[id_].pos.y + module_map[id_].height)
+
+    return y
+
+
+def find_z(module_map, placed, target_id, p1, p2):
+    p1_list = set()
+    p2_list = set()
+    for id_ in p1:
+        if id_ == target_id:
+            break
+        if id_ in placed:
+            p1_list.add(id_)
+
+    for id_ in p2:
+        if id_ == target_id:
+            break
+        if id_ in placed:
+            p2_list.add(id_)
+
+    z = 0
+    for id_ in p1_list & p2_list:
+        z = max(z, module_map[id_].pos.z + module_map[id_].depth)
+
+    return z
+
+
+if __name__ == '__main__':
+    main()
@@ -3,7 +3,9 @@
 
 __doc__ = """
 Usage:
-    {f} [-i | --input <input_file>] [-o | --output <output_file>] [-t | --type <type>]
+    {f} [-i | --input <input_file>] [-o | --output <output_file>] [-t | --type <type>] [-w | --workers <workers>]
+        [-r | --replicas <replicas>] [-s | --swap <swap_interval>] [-l | --limit <seconds>] [-a | --astar]
+        [-n | --negotiate] [-d | --bidirectional] [-c | --corridor <margin>] [-e | --incremental]
     {f} [-b | --bp] [-i | --input <input_file>] [-o | --output <output_file>]
     {f} -h | --help
 
@@ -11,6 +13,15 @@ Options:
     -i --input=<input_file>     input file
     -o --output=<output_file>   output file     [default: result.json]
     -t --type=<type>            split type      [default: primal]
+    -w --workers=<workers>      number of parallel placement annealers  [default: 1]
+    -r --replicas=<replicas>    number of parallel tempering replicas (0: simulated annealing)  [default: 0]
+    -s --swap=<swap_interval>   moves per replica between replica exchanges  [default: 100]
+    -l --limit=<seconds>        wall-clock budget of each annealing run in seconds
+    -a --astar                  route the initial paths with A* search
+    -n --negotiate              reroute only congested nets with negotiated-congestion costs
+    -d --bidirectional          route the initial paths with bidirectional search
+    -c --corridor=<margin>      search routes within the src/dst box widened by margin, doubling it on failure
+    -e --incremental            keep legal routes and reroute only the congested segments, splicing them in
     -h --help                   show this screen
 """.format(f=__file__)
 
@@ -33,7 +44,18 @@ def main():
     input_file = args['--input'][0]
     output_file = args['--output'][0]
     type_ = args['--type'][0]
+    workers = int(args['--workers'][0])
+    replicas = int(args['--replicas'][0])
+    swap_interval = int(args['--swap'][0])
+    time_limit = float(args['--limit'][0]) if args['--limit'] else None
+    a_star = args['--astar']
+    negotiated = args['--negotiate']
+    bidirectional = args['--bidirectional']
+    corridor = int(args['--corridor'][0]) if args['--corridor'] else None
+    incremental = args['--incremental']
     braid_pack = args['-b'] or args['--bp']
+    if corridor is not None and corridor < 1:
+        exit("--corridor must be 1 or more")
 
     # preparation
     circuit = CircuitReader().read_circuit(input_file)
@@ -50,7 +72,8 @@ def main():
         loop_list = Transformation(graph).execute()
 
         # optimization of topology
-        graph = Relocation(type_, loop_list, graph).execute()
+        graph = Relocation(type_, loop_list, graph, workers, replicas, swap_interval, time_limit, a_star,
+                           negotiated, bidirectional, corridor, incremental).execute()
 
     elapsed_time = time.time() - start
     print("result cost: {}".format(evaluate(graph)))
@@ -71,6 +94,17 @@ def evaluate(graph):
             d_max_x, d_max_y, d_max_z = max(node.x, d_max_x), max(node.y, d_max_y), max(node.z, d_max_z)
             d_min_x, d_min_y, d_min_z = min(node.x, d_min_x), min(node.y, d_min_y), min(node.z, d_min_z)
 
+    has_primal, has_dual = p_max_x != -math.inf, d_max_x != -math.inf
+    if not has_primal and not has_dual:
+        return 0
+
+    # 片方の種類のノードしかない場合は, その種類の範囲のみで評価する
+    if not has_primal:
+        p_max_x, p_max_y, p_max_z, p_min_x, p_min_y, p_min_z = d_max_x, d_max_y, d_max_z, d_min_x, d_min_y, d_min_z
+    if not has_primal or not has_dual:
+        d_max_x, d_max_y, d_max_z = p_max_x, p_max_y, p_max_z
+        d_min_x = d_min_y = d_min_z = 0
+
     width = (p_max_x - p_min_x) / 2 + 1
     height = (p_max_y - p_min_y) / 2 + 1
     depth = (p_max_z - p_min_z) / 2 + 1
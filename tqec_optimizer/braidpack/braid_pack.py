@@ -1,6 +1,7 @@
 import math
+from collections import defaultdict
 
-from ..vector3d import Vector3D, Size
+from ..vector3d import Size
 from ..node import Node
 from ..edge import Edge
 
@@ -10,6 +11,8 @@ class Braidpack:
         self._graph = graph
         self._size = self.__create_size()
         self._var_node_count = graph.var_node_count
+        # Z座標をkeyとした, Z軸方向以外の辺の索引. 辺はグラフに追加した順に並ぶ
+        self._slice_edge_map = defaultdict(dict)
 
         self.__delete_not_closed()
 
@@ -20,29 +23,44 @@ class Braidpack:
 
     def __compress(self):
         """
-        Z軸方向に圧縮する　
+        Z軸方向に圧縮する
+        辺を移動したZ座標とその前後2つのZ座標のみを次に調べ直し, 移動できる辺が無くなるまで繰り返す
         """
-        for n in range(0, 20):
+        for edge in self._graph.edge_list:
+            if edge.dir != "Z":
+                self._slice_edge_map[edge.z][id(edge)] = edge
+
+        # 辺の移動によって移動できる辺が変わり得るZ座標の集合
+        dirty_set = set(range(3, self._size.z + 1))
+        pass_count, move_count = 0, 0
+        while len(dirty_set) > 0:
+            pass_count += 1
             for z in range(3, self._size.z + 1):
+                if z not in dirty_set:
+                    continue
+                dirty_set.discard(z)
+
                 press_edge_list = []
                 slide_x_edge_list = []
                 slide_y_edge_list = []
-                for edge in self._graph.edge_list:
-                    if edge.z == z and edge.dir != "Z":
-                        if self.__can_move(edge):
-                            press_edge_list.append(edge)
-                        elif edge.dir == "Y" and self.__can_move_x(edge):
-                            slide_x_edge_list.append(edge)
-                        elif edge.dir == "X" and self.__can_move_y(edge):
-                            slide_y_edge_list.append(edge)
+                for edge in self._slice_edge_map[z].values():
+                    if self.__can_move(edge):
+                        press_edge_list.append(edge)
+                    elif edge.dir == "Y" and self.__can_move_x(edge):
+                        slide_x_edge_list.append(edge)
+                    elif edge.dir == "X" and self.__can_move_y(edge):
+                        slide_y_edge_list.append(edge)
 
                 self.__move(press_edge_list)
                 # self.__slide_x(slide_x_edge_list)
                 # self.__slide_y(slide_y_edge_list)
 
-                press_edge_list.clear()
-                slide_x_edge_list.clear()
-                slide_y_edge_list.clear()
+                # 辺の移動で変わるのはZ座標z-2からzまでの辺とノードであり, それらを参照する辺はz+2までにある
+                if len(press_edge_list) > 0:
+                    move_count += len(press_edge_list)
+                    dirty_set.update(range(max(z - 2, 3), min(z + 2, self._size.z) + 1))
+
+        print("braidpack: {} moves in {} passes".format(move_count, pass_count))
 
     def __move(self, edge_list):
         for edge in edge_list:
@@ -178,161 +196,73 @@ class Braidpack:
                 new_node2.add_edge(new_edge3)
 
     def __can_move(self, edge):
-        cross_pos = Vector3D(edge.x, edge.y, edge.z - 1)
-        next_pos = Vector3D(edge.x, edge.y, edge.z - 2)
-        for e in self._graph.edge_list:
-            if e.x == cross_pos.x and e.y == cross_pos.y and e.z == cross_pos.z:
-                return False
-            if e.x == next_pos.x and e.y == next_pos.y and e.z == next_pos.z:
-                return False
-
-        node1, node2 = edge.node1, edge.node2
-        obstacle_node1, obstacle_node2 = None, None
-        can_move1, can_move2 = False, False
-        for node in self._graph.node_list:
-            if node.x == node1.x and node.y == node1.y and node.z == node1.z - 2:
-                obstacle_node1 = node
-            if node.x == node2.x and node.y == node2.y and node.z == node2.z - 2:
-                obstacle_node2 = node
-
-        if obstacle_node1 is None:
-            can_move1 = True
-        else:
-            for edge in obstacle_node1.edge_list:
-                alt_node = edge.alt_node(obstacle_node1)
-                if alt_node == node1:
-                    can_move1 = True
-
-        if obstacle_node2 is None:
-            can_move2 = True
-        else:
-            for edge in obstacle_node2.edge_list:
-                alt_node = edge.alt_node(obstacle_node2)
-                if alt_node == node2:
-                    can_move2 = True
-
-        if can_move1 and can_move2:
-            return True
-
-        return False
+        return self.__can_shift(edge, 0, 0, -1)
 
     def __can_move_x(self, edge):
         coef = self.__calc_gravity_dir(edge, "X")
-        cross_pos = Vector3D(edge.x + 1 * coef, edge.y, edge.z)
-        next_pos = Vector3D(edge.x + 2 * coef, edge.y, edge.z)
-        for e in self._graph.edge_list:
-            if e.x == cross_pos.x and e.y == cross_pos.y and e.z == cross_pos.z:
-                return False
-            if e.x == next_pos.x and e.y == next_pos.y and e.z == next_pos.z:
-                return False
-
-        node1, node2 = edge.node1, edge.node2
-        obstacle_node1, obstacle_node2 = None, None
-        can_move1, can_move2 = False, False
-        for node in self._graph.node_list:
-            if node.x == node1.x + 2 * coef and node.y == node1.y and node.z == node1.z:
-                obstacle_node1 = node
-            if node.x == node2.x + 2 * coef and node.y == node2.y and node.z == node2.z:
-                obstacle_node2 = node
-
-        if obstacle_node1 is None:
-            can_move1 = True
-        else:
-            for edge in obstacle_node1.edge_list:
-                alt_node = edge.alt_node(obstacle_node1)
-                if alt_node == node1:
-                    can_move1 = True
-
-        if obstacle_node2 is None:
-            can_move2 = True
-        else:
-            for edge in obstacle_node2.edge_list:
-                alt_node = edge.alt_node(obstacle_node2)
-                if alt_node == node2:
-                    can_move2 = True
-
-        if can_move1 and can_move2:
-            return True
-
-        return False
+        return self.__can_shift(edge, coef, 0, 0)
 
     def __can_move_y(self, edge):
         coef = self.__calc_gravity_dir(edge, "Y")
-        cross_pos = Vector3D(edge.x, edge.y + 1 * coef, edge.z)
-        next_pos = Vector3D(edge.x, edge.y + 2 * coef, edge.z)
-        for e in self._graph.edge_list:
-            if e.x == cross_pos.x and e.y == cross_pos.y and e.z == cross_pos.z:
-                return False
-            if e.x == next_pos.x and e.y == next_pos.y and e.z == next_pos.z:
+        return self.__can_shift(edge, 0, coef, 0)
+
+    def __can_shift(self, edge, dx, dy, dz):
+        """
+        辺を(2 * dx, 2 * dy, 2 * dz)だけ平行移動できるならTrue
+        移動の途中と移動先に辺が無く, 移動先の各ノードが存在しないか移動元のノードと辺で結ばれていれば移動できる
+        グラフの座標の索引を引くため, 判定は辺とノードの数によらない
+
+        :param edge 移動する辺
+        :param dx X軸方向の移動の向き
+        :param dy Y軸方向の移動の向き
+        :param dz Z軸方向の移動の向き
+        """
+        if self._graph.edge(edge.x + dx, edge.y + dy, edge.z + dz) is not None:
+            return False
+        if self._graph.edge(edge.x + 2 * dx, edge.y + 2 * dy, edge.z + 2 * dz) is not None:
+            return False
+
+        for node in (edge.node1, edge.node2):
+            obstacle_node = self._graph.node(node.x + 2 * dx, node.y + 2 * dy, node.z + 2 * dz)
+            if obstacle_node is None:
+                continue
+            if all(e.alt_node(obstacle_node) != node for e in obstacle_node.edge_list):
                 return False
 
-        node1, node2 = edge.node1, edge.node2
-        obstacle_node1, obstacle_node2 = None, None
-        can_move1, can_move2 = False, False
-        for node in self._graph.node_list:
-            if node.x == node1.x and node.y == node1.y + 2 * coef and node.z == node1.z:
-                obstacle_node1 = node
-            if node.x == node2.x and node.y == node2.y + 2 * coef and node.z == node2.z:
-                obstacle_node2 = node
-
-        if obstacle_node1 is None:
-            can_move1 = True
-        else:
-            for edge in obstacle_node1.edge_list:
-                alt_node = edge.alt_node(obstacle_node1)
-                if alt_node == node1:
-                    can_move1 = True
-
-        if obstacle_node2 is None:
-            can_move2 = True
-        else:
-            for edge in obstacle_node2.edge_list:
-                alt_node = edge.alt_node(obstacle_node2)
-                if alt_node == node2:
-                    can_move2 = True
-
-        if can_move1 and can_move2:
-            return True
-
-        return False
+        return True
 
     def __delete_not_closed(self):
         """
         閉じていないdefectを削除する
         """
-        non_loop_edge_index = []
-        non_loop_node_index = []
-        for no, edge in enumerate(self._graph.edge_list):
+        non_loop_edge_list = []
+        non_loop_node_map = {}
+        for edge in self._graph.edge_list:
             # 閉じていないdefectにはidに0が振られている
             if edge.id == 0:
-                non_loop_edge_index.append(no)
+                non_loop_edge_list.append(edge)
                 (node1, node2) = (edge.node1, edge.node2)
-                non_loop_node_index.append(self._graph.node_list.index(node1))
-                non_loop_node_index.append(self._graph.node_list.index(node2))
-
-        non_loop_edge_index.reverse()
-        # 重複した要素を取り除く
-        non_loop_node_index = list(set(non_loop_node_index))
-        non_loop_node_index.sort()
-        non_loop_node_index.reverse()
+                # 重複した要素を取り除く
+                non_loop_node_map.setdefault(node1, node1)
+                non_loop_node_map.setdefault(node2, node2)
 
         # delete edge
-        for index in non_loop_edge_index:
-            del self._graph.edge_list[index]
+        for edge in non_loop_edge_list:
+            self._graph.remove_edge(edge)
 
         # delete node
         del_edge = None
-        for index in non_loop_node_index:
+        for node in non_loop_node_map.values():
             has_injector = False
-            for edge in self._graph.node_list[index].edge_list:
+            for edge in node.edge_list:
                 if edge.is_injector():
                     has_injector = True
                 if edge.id == 0:
                     del_edge = edge
             if del_edge is not None:
-                self._graph.node_list[index].remove_edge(del_edge)
+                node.remove_edge(del_edge)
             if not has_injector:
-                del self._graph.node_list[index]
+                self._graph.remove_node(node)
 
     def __calc_gravity_dir(self, edge, dir_):
         result = 1
@@ -345,12 +275,8 @@ class Braidpack:
 
     def __calc_x_gravity_dir(self, edge):
         dir_ = 0
-        p_exist, n_exist = False, False
-        for e in self._graph.edge_list:
-            if edge.x + 1 == e.x and edge.y == e.y and edge.z == e.z:
-                p_exist = True
-            if edge.x - 1 == e.x and edge.y == e.y and edge.z == e.z:
-                n_exist = True
+        p_exist = self._graph.edge(edge.x + 1, edge.y, edge.z) is not None
+        n_exist = self._graph.edge(edge.x - 1, edge.y, edge.z) is not None
 
         if not p_exist and not n_exist:
             dir_ = 1
@@ -363,12 +289,8 @@ class Braidpack:
 
     def __calc_y_gravity_dir(self, edge):
         dir_ = 0
-        p_exist, n_exist = False, False
-        for e in self._graph.edge_list:
-            if edge.x == e.x and edge.y + 1 == e.y and edge.z == e.z:
-                p_exist = True
-            if edge.x == e.x and edge.y - 1 == e.y and edge.z == e.z:
-                n_exist = True
+        p_exist = self._graph.edge(edge.x, edge.y + 1, edge.z) is not None
+        n_exist = self._graph.edge(edge.x, edge.y - 1, edge.z) is not None
 
         if not p_exist and not n_exist:
             dir_ = 1
@@ -394,13 +316,9 @@ class Braidpack:
 
         :param del_node 削除するノード
         """
-        del_node_index = -1
-        for no, node in enumerate(self._graph.node_list):
-            if del_node == node:
-                del_node_index = no
-
-        if del_node_index > -1:
-            del self._graph.node_list[del_node_index]
+        del_node = self._graph.node(del_node.x, del_node.y, del_node.z)
+        if del_node is not None:
+            self._graph.remove_node(del_node)
 
     def __delete_edge(self, del_edge):
         """
@@ -408,13 +326,10 @@ class Braidpack:
 
         :param del_edge 削除する辺
         """
-        del_edge_index = -1
-        for no, edge in enumerate(self._graph.edge_list):
-            if del_edge == edge:
-                del_edge_index = no
-
-        if del_edge_index > -1:
-            del self._graph.edge_list[del_edge_index]
+        del_edge = self._graph.edge(del_edge.x, del_edge.y, del_edge.z)
+        if del_edge is not None:
+            self._graph.remove_edge(del_edge)
+            self._slice_edge_map[del_edge.z].pop(id(del_edge), None)
 
     @staticmethod
     def __edge(node1, node2):
@@ -428,9 +343,9 @@ class Braidpack:
         return self._var_node_count
 
     def __new_node(self, type_, x, y, z):
-        for node in self._graph.node_list:
-            if node.x == x and node.y == y and node.z == z:
-                return node, True
+        node = self._graph.node(x, y, z)
+        if node is not None:
+            return node, True
 
         node = Node(x, y, z, self.__new_node_variable(), type_)
         self._graph.add_node(node)
@@ -450,5 +365,7 @@ class Braidpack:
         node1.add_edge(edge)
         node2.add_edge(edge)
         self._graph.add_edge(edge)
+        if edge.dir != "Z":
+            self._slice_edge_map[edge.z][id(edge)] = edge
 
         return edge
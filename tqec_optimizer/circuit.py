@@ -1,3 +1,6 @@
+from collections import defaultdict
+
+
 class Circuit:
     """
     回路を表すクラス
@@ -10,6 +13,8 @@ class Circuit:
         self._initializations = []
         self._measurements = []
         self._operations = []
+        self._timeline = []
+        self._cut_points = defaultdict(set)
         self._length = 0
         self._width = 0
 
@@ -45,6 +50,14 @@ class Circuit:
     def operations(self):
         return self._operations
 
+    @property
+    def timeline(self):
+        return self._timeline
+
+    @property
+    def cut_points(self):
+        return self._cut_points
+
     def add_bits(self, n):
         self._bits.append(n)
 
@@ -67,28 +80,44 @@ class Circuit:
         """
         量子回路情報からTQEC回路に必要な情報を更新する
         """
-        cnot_length, injector_length = 0, 0
+        operation_length = self.__create_timeline()
+        last_operation = self._operations[-1] if len(self._operations) > 0 else None
+
+        # 最後の演算がS or Tで外部出力がある場合は回路を一段階伸ばす
+        expand_length = 0
+        for output in self._outputs:
+            if last_operation["type"] != "cnot" and last_operation["target"] == output:
+                expand_length += 2
+
+        self._length = operation_length + expand_length
+        self._width = len(self._bits) * 2
+
+    def __create_timeline(self):
+        """
+        各演算を設置するz座標と, CNOTによりビット列を切断する箇所を求める
+        CNOTは6, 同じビットに連続するState Injectionは2だけz座標を進める
+
+        :return 全ての演算を設置するのに必要な長さ
+        """
+        z = 0
         injector_target = {}
-        last_operation = None
+        self._timeline = []
+        self._cut_points = defaultdict(set)
         for operation in self._operations:
             if operation["type"] == "cnot":
-                cnot_length += 1
+                self._timeline.append((z, operation))
+                # 制御ビットのz + 2 ~ z + 4の区間は切断する
+                self._cut_points[operation["control"] * 2].add(z + 4)
                 injector_target.clear()
+                z += 6
             else:
                 if operation["target"] in injector_target:
-                    injector_length += 1
+                    z += 2
                     injector_target.clear()
+                self._timeline.append((z, operation))
                 injector_target[operation["target"]] = operation["type"]
-            last_operation = operation
-
-        # 最後の演算がS or Tで外部出力がある場合は回路を一段階伸ばす
-        expand_length = 0
-        for output in self._outputs:
-            if last_operation["type"] != "cnot" and last_operation["target"] == output:
-                expand_length += 2
 
-        self._length = cnot_length * 6 + injector_length * 2 + expand_length
-        self._width = len(self._bits) * 2
+        return z
 
     def dump(self):
         print("bits :", self._bits)
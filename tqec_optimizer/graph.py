@@ -1,4 +1,5 @@
 import copy
+from collections import defaultdict
 
 from .vector3d import Vector3D
 from .node import Node
@@ -23,6 +24,16 @@ class Graph:
         self._var_node_count = 0
         self._var_loop_count = 0
 
+        # 座標をkeyとした探索用の索引
+        self._node_map = {}
+        self._edge_map = {}
+        self._column_edge_map = defaultdict(lambda: defaultdict(list))
+        self._loop_edge_map = defaultdict(dict)
+
+        # 削除済みでまだリストから取り除いていないノードと辺のid()
+        self._removed_node_set = set()
+        self._removed_edge_set = set()
+
         if circuit is not None:
             self.__create()
 
@@ -47,10 +58,14 @@ class Graph:
 
     @property
     def node_list(self):
+        if len(self._removed_node_set) > 0:
+            self.__compact_node_list()
         return self._node_list
 
     @property
     def edge_list(self):
+        if len(self._removed_edge_set) > 0:
+            self.__compact_edge_list()
         return self._edge_list
 
     @property
@@ -61,10 +76,84 @@ class Graph:
         self._var_loop_count = loop_count
 
     def add_node(self, node):
+        if id(node) in self._removed_node_set:
+            self.__compact_node_list()
         self._node_list.append(node)
+        self._node_map.setdefault((node.x, node.y, node.z), node)
 
     def add_edge(self, edge):
+        if id(edge) in self._removed_edge_set:
+            self.__compact_edge_list()
         self._edge_list.append(edge)
+        self._edge_map.setdefault((edge.x, edge.y, edge.z), edge)
+        self._column_edge_map[edge.x][edge.z].append(edge)
+        self._loop_edge_map[edge.id][edge] = edge
+
+    def remove_node(self, node):
+        """
+        指定されたノードをグラフと索引から削除する
+        リストからは次に参照された時にまとめて取り除く
+
+        :param node 削除するノード
+        """
+        self._removed_node_set.add(id(node))
+        if self._node_map.get((node.x, node.y, node.z)) is node:
+            del self._node_map[(node.x, node.y, node.z)]
+
+    def remove_edge(self, edge):
+        """
+        指定された辺をグラフと索引から削除する
+        リストからは次に参照された時にまとめて取り除く
+
+        :param edge 削除する辺
+        """
+        self._removed_edge_set.add(id(edge))
+        if self._edge_map.get((edge.x, edge.y, edge.z)) is edge:
+            del self._edge_map[(edge.x, edge.y, edge.z)]
+        column = self._column_edge_map[edge.x][edge.z]
+        for no, e in enumerate(column):
+            if e is edge:
+                del column[no]
+                break
+        self._loop_edge_map[edge.id].pop(edge, None)
+
+    def __compact_node_list(self):
+        self._node_list[:] = [node for node in self._node_list if id(node) not in self._removed_node_set]
+        self._removed_node_set.clear()
+
+    def __compact_edge_list(self):
+        self._edge_list[:] = [edge for edge in self._edge_list if id(edge) not in self._removed_edge_set]
+        self._removed_edge_set.clear()
+
+    def node(self, x, y, z):
+        """
+        座標(x, y, z)にあるノードを返す. 存在しなければNone
+        """
+        return self._node_map.get((x, y, z))
+
+    def edge(self, x, y, z):
+        """
+        中点が(x, y, z)となる辺を返す. 存在しなければNone
+        """
+        return self._edge_map.get((x, y, z))
+
+    def loop_edge_list(self, loop_id):
+        """
+        ループ番号がloop_idの辺のリストを返す
+        """
+        return list(self._loop_edge_map.get(loop_id, {}).values())
+
+    def set_edge_id(self, edge, id_):
+        """
+        辺のループ番号を更新し, ループ番号の索引も更新する
+        グラフから削除済みの辺は索引に戻さない
+
+        :param edge 対象の辺
+        :param id_ 新しいループ番号
+        """
+        if self._loop_edge_map[edge.id].pop(edge, None) is not None:
+            self._loop_edge_map[id_][edge] = edge
+        edge.set_id(id_)
 
     def __create_bit_lines(self):
         """
@@ -79,26 +168,11 @@ class Graph:
         for x in range(0, self._circuit.width, 2):
             last_upper_node = None
             last_lower_node = None
+            cut_points = self._circuit.cut_points.get(x, set())
             for z in range(0, self._circuit.length + 1, 2):
 
                 # CNOT 箇所は切断する
-                skip = False
-                cnot_x, cnot_z = 0, 0
-                injector_target = {}
-                for no, operation in enumerate(self._circuit.operations):
-                    if operation["type"] == "cnot":
-                        injector_target.clear()
-                        cnot_x = operation["control"] * 2
-                        cnot_z += 6
-                    else:
-                        if len(injector_target) > 0 and operation["target"] in injector_target:
-                            cnot_z += 2
-                            injector_target.clear()
-                        injector_target[operation["target"]] = operation["type"]
-                        cnot_x = -1
-
-                    if x == cnot_x and z == cnot_z - 2:
-                        skip = True
+                skip = z in cut_points
 
                 upper_node = self.__new_node(type, x, upper, z)
                 lower_node = self.__new_node(type, x, lower, z)
@@ -178,24 +252,11 @@ class Graph:
         CNOTとState Injectionを追加する
         初期回路のグラフ化に使用
         """
-        z = 0
-        injector_target = {}
-        for operation in self._circuit.operations:
+        for z, operation in self._circuit.timeline:
             if operation["type"] == "cnot":
                 self.__create_braidings(z, operation)
-                injector_target.clear()
-                z += 6
             else:
-                if len(injector_target) > 0:
-                    if operation["target"] in injector_target:
-                        z += 2
-                        self.__create_state_injection(z, operation)
-                        injector_target.clear()
-                    else:
-                        self.__create_state_injection(z, operation)
-                else:
-                    self.__create_state_injection(z, operation)
-                injector_target[operation["target"]] = operation["type"]
+                self.__create_state_injection(z, operation)
 
     def __create_state_injection(self, z, operation):
         """
@@ -327,9 +388,7 @@ class Graph:
         """
         CNOTのtargetとbit列の交差情報を更新する
         """
-        z = 0
-        injector_target = {}
-        for no, operation in enumerate(self._circuit.operations):
+        for z, operation in self._circuit.timeline:
             if operation["type"] == "cnot" and operation["control"] < operation["targets"][0]:
                 for target in operation["targets"]:
                     x = target * 2
@@ -354,16 +413,6 @@ class Graph:
                     primal_edge.add_cross_edge(dual_edge)
                     dual_edge.add_cross_edge(primal_edge)
 
-            if operation["type"] == "cnot":
-                z += 6
-                injector_target.clear()
-            else:
-                if len(injector_target) > 0:
-                    if operation["target"] in injector_target:
-                        z += 2
-                        injector_target.clear()
-                injector_target[operation["target"]] = operation["type"]
-
     def __assign_line_id(self, x, z, id):
         """
         x列のz座標より置くの辺に対してループの番号idを振る
@@ -372,36 +421,37 @@ class Graph:
         :param z この座標から奥のビットにidを振る
         :param id 構成する辺に振る番号
         """
-        for edge in self._edge_list:
-            if edge.x == x and edge.z > z:
-                edge.set_id(id)
+        for edge_z, edge_list in self._column_edge_map[x].items():
+            if edge_z > z:
+                for edge in edge_list:
+                    self.set_edge_id(edge, id)
 
     def __get_front_edge_loop_id(self, x, z):
-        for edge in self._edge_list:
+        # z座標で終わるZ方向の辺は中点のz座標がz - 1となる
+        for edge in self._column_edge_map[x].get(z - 1, []):
             if (edge.node1.x == x and edge.node1.z == z and edge.node2.z < z) \
                     or (edge.node2.x == x and edge.node2.z == z and edge.node1.z < z):
                 return edge.id
 
     def __remove_loop_id(self, loop_id):
-        for edge in self._edge_list:
+        for edge in self.loop_edge_list(loop_id):
             if edge.id == loop_id:
-                edge.set_id(0)
+                self.set_edge_id(edge, 0)
 
     def __node(self, x, y, z, id_=0):
         if id_ == 0:
-            for node in self._node_list:
-                if node.x == x and node.y == y and node.z == z:
-                    return node
+            return self._node_map.get((x, y, z))
         else:
             for node in self._node_list:
                 if node.id == id_:
                     return node
 
     def __edge(self, node1, node2):
-        for edge in node1.edge_list:
-            alt_node = edge.alt_node(node1)
-            if alt_node == node2:
-                return edge
+        edge = self._edge_map.get((int((node1.x + node2.x) / 2),
+                                   int((node1.y + node2.y) / 2),
+                                   int((node1.z + node2.z) / 2)))
+        if edge is not None and node1 in (edge.node1, edge.node2) and node2 in (edge.node1, edge.node2):
+            return edge
 
     def __new_node_variable(self):
         self._var_node_count += 1
@@ -413,7 +463,7 @@ class Graph:
 
     def __new_node(self, type_, x, y, z):
         node = Node(x, y, z, self.__new_node_variable(), type_)
-        self._node_list.append(node)
+        self.add_node(node)
 
         return node
 
@@ -421,13 +471,13 @@ class Graph:
         edge = Edge(node1, node2, category, id_)
         node1.add_edge(edge)
         node2.add_edge(edge)
-        self.edge_list.append(edge)
+        self.add_edge(edge)
 
         return edge
 
     def dump(self):
-        for node in self._node_list:
+        for node in self.node_list:
             node.dump()
 
-        for edge in self._edge_list:
+        for edge in self.edge_list:
             edge.dump()
@@ -1,15 +1,20 @@
 import random
-import math
 
-from collections import defaultdict
+from collections import defaultdict, Counter
+
+from .joint_union_find import JointUnionFind
+from .annealing import Annealing
 
 
 class Allocation:
-    def __init__(self, module_list, id_set):
+    def __init__(self, module_list, id_set, time_limit=None):
         self._module_list = module_list
         self._id_set = id_set
-        self._edge_map = {}
-        self._connect_edge = defaultdict(list)
+        self._time_limit = time_limit
+        self._connect_edge_list = []
+        self._coordinate_map = defaultdict(Counter)
+        self._extent_map = {}
+        self._cost = 0.0
 
         # init
         for module_ in self._module_list:
@@ -25,15 +30,12 @@ class Allocation:
         self.__sa()
 
     def __sa(self):
-        initial_t = 100
-        final_t = 0.01
-        cool_rate = 0.97
-        limit = 100
-
-        current_cost = self.__evaluate(self._module_list)
-        t = initial_t
-        while t > final_t:
-            for n in range(limit):
+        annealing = Annealing(cool_rate=0.97, time_limit=self._time_limit)
+
+        current_cost = self.__create_extent_map()
+        best_cost, best_id_list = current_cost, self.__take_id_list()
+        for t in annealing.schedule(current_cost):
+            for n in range(annealing.limit):
                 module_size = len(self._module_list)
                 module_index = random.randint(0, module_size - 1)
                 cross_edge_size = len(self._module_list[module_index].cross_edge_list)
@@ -45,21 +47,36 @@ class Allocation:
                 if not self.__swap(module_index, edge_index1, edge_index2):
                     continue
 
-                new_cost = self.__evaluate(self._module_list)
+                new_cost = self.__update_extent(module_index, edge_index1, edge_index2)
 
-                if self.__should_change(new_cost - current_cost, t):
+                if annealing.accept(current_cost, new_cost):
                     current_cost = new_cost
+                    if new_cost < best_cost:
+                        best_cost, best_id_list = new_cost, self.__take_id_list()
                 else:
                     self.__swap(module_index, edge_index1, edge_index2)
-            t *= cool_rate
+                    self.__update_extent(module_index, edge_index1, edge_index2)
 
-    @staticmethod
-    def __should_change(delta, t):
-        if delta <= 0:
-            return 1
-        if random.random() < math.exp(- delta / t):
-            return 1
-        return 0
+        # 最後の割当が最良とは限らないため, 最良の割当に戻す
+        self.__restore_id_list(best_id_list)
+
+    def __take_id_list(self):
+        """
+        全ての交差辺のidをモジュール順に並べた配列を返す
+        """
+        return [edge.id for module_ in self._module_list for edge in module_.cross_edge_list]
+
+    def __restore_id_list(self, id_list):
+        """
+        __take_id_listで記録したidを交差辺に書き戻す
+
+        :param id_list 交差辺のidの配列
+        """
+        edge_list = [edge for module_ in self._module_list for edge in module_.cross_edge_list]
+        for edge, id_ in zip(edge_list, id_list):
+            edge.set_id(id_)
+            edge.node1.set_id(id_)
+            edge.node2.set_id(id_)
 
     def __swap(self, module_index, edge_index1, edge_index2):
         edge1 = self._module_list[module_index].cross_edge_list[edge_index1]
@@ -79,58 +96,69 @@ class Allocation:
 
         return True
 
-    @staticmethod
-    def __evaluate(module_list):
-        cross_node_map = defaultdict(list)
-        for module_ in module_list:
+    def __create_extent_map(self):
+        """
+        idごとに交差辺の端点の座標の多重集合と, それを囲む直方体の辺の長さの和を求め, コストを返す
+        """
+        self._coordinate_map.clear()
+        for module_ in self._module_list:
             for node in module_.cross_node_list:
-                cross_node_map[node.id].append(node)
+                self._coordinate_map[node.id][(node.x, node.y, node.z)] += 1
 
-        point = 0.0
-        for id_, node_list in cross_node_map.items():
-            min_x = min_y = min_z = math.inf
-            max_x = max_y = max_z = -math.inf
-            for node in node_list:
-                min_x, min_y, min_z = min(node.x, min_x), min(node.y, min_y), min(node.z, min_z)
-                max_x, max_y, max_z = max(node.x, max_x), max(node.y, max_y), max(node.z, max_z)
+        self._extent_map = {id_: self.__extent(coordinate_set)
+                            for id_, coordinate_set in self._coordinate_map.items()}
+        self._cost = sum(self._extent_map.values()) * 2.0
 
-            point += ((max_x - min_x) + (max_y - min_y) + (max_z - min_z)) * 2.0
+        return self._cost
 
-        return point
+    def __update_extent(self, module_index, edge_index1, edge_index2):
+        """
+        idを交換した2本の交差辺の端点を交換後のidに移し, 2つのidの分だけコストを更新して返す
 
-    def __detect_connect_edge(self):
-        for module_ in self._module_list:
-            for joint_pair in module_.joint_pair_list:
-                joint1, joint2 = joint_pair[0], joint_pair[1]
-                edge = joint_pair[2]
-
-                if joint1 in self._edge_map and joint2 in self._edge_map:
-                    self._connect_edge[self._edge_map[joint1]].extend(self._connect_edge[self._edge_map[joint2]])
-                    self._connect_edge[self._edge_map[joint1]].append(edge)
-                    del_edge = self._edge_map[joint2]
-
-                    for edge in self._connect_edge[self._edge_map[joint2]]:
-                        node1, node2 = edge.node1, edge.node2
-                        self._edge_map[node1] = self._edge_map[joint1]
-                        self._edge_map[node2] = self._edge_map[joint1]
+        :param module_index 交差辺を持つモジュールの番号
+        :param edge_index1 交差辺の番号
+        :param edge_index2 交差辺の番号
+        """
+        edge1 = self._module_list[module_index].cross_edge_list[edge_index1]
+        edge2 = self._module_list[module_index].cross_edge_list[edge_index2]
+        id1, id2 = edge1.id, edge2.id
+        if id1 == id2:
+            return self._cost
+
+        for edge, from_id, to_id in ((edge1, id2, id1), (edge2, id1, id2)):
+            for node in (edge.node1, edge.node2):
+                coordinate = (node.x, node.y, node.z)
+                from_set = self._coordinate_map[from_id]
+                from_set[coordinate] -= 1
+                if from_set[coordinate] == 0:
+                    del from_set[coordinate]
+                self._coordinate_map[to_id][coordinate] += 1
+
+        for id_ in (id1, id2):
+            extent = self.__extent(self._coordinate_map[id_])
+            self._cost += (extent - self._extent_map.get(id_, 0)) * 2.0
+            self._extent_map[id_] = extent
+
+        return self._cost
 
-                    del self._connect_edge[del_edge]
+    @staticmethod
+    def __extent(coordinate_set):
+        """
+        座標の集合を囲む直方体の辺の長さの和を返す
 
-                elif joint1 in self._edge_map:
-                    self._edge_map[joint2] = self._edge_map[joint1]
-                    self._connect_edge[self._edge_map[joint1]].append(edge)
+        :param coordinate_set 座標の多重集合
+        """
+        if not coordinate_set:
+            return 0
+        x_list, y_list, z_list = zip(*coordinate_set)
 
-                elif joint2 in self._edge_map:
-                    self._edge_map[joint1] = self._edge_map[joint2]
-                    self._connect_edge[self._edge_map[joint2]].append(edge)
+        return (max(x_list) - min(x_list)) + (max(y_list) - min(y_list)) + (max(z_list) - min(z_list))
 
-                else:
-                    self._edge_map[joint1] = edge
-                    self._edge_map[joint2] = edge
-                    self._connect_edge[edge].append(edge)
+    def __detect_connect_edge(self):
+        self._connect_edge_list = JointUnionFind(self._module_list).group_list
 
     def __assign_connect_edge(self):
-        for key_edge, edge_list in sorted(self._connect_edge.items(), key=lambda x: len(x[1]), reverse=True):
+        for edge_list in self._connect_edge_list:
             if len(edge_list) == 1:
                 break
 
@@ -0,0 +1,120 @@
+import random
+import math
+import time
+
+
+class Annealing:
+    """
+    焼きなましの温度の管理と終了判定を行う
+
+    各温度でlimit回の試行を行い, 受理率が高すぎる(ほぼ全て受理)か低すぎる(ほぼ全て棄却)温度帯では速く冷やす
+    受理率がfrozen_ratioを下回るまで冷え切り, 最良のコストがwindow回の試行の間更新されなかった場合は収束したとみなして打ち切る
+    time_limitを指定した場合はその秒数を超えた時点で打ち切る
+    """
+    def __init__(self, initial_t=100, final_t=0.01, cool_rate=0.99, limit=100,
+                 adaptive=True, window=None, frozen_ratio=0.01, time_limit=None):
+        """
+        コンストラクタ
+
+        :param initial_t 初期温度
+        :param final_t 終了温度
+        :param cool_rate 1ステップごとの冷却率
+        :param limit 1つの温度での試行回数
+        :param adaptive 受理率に応じて冷却を速めるならTrue
+        :param window 収束の判定に用いる試行回数. 省略した場合はlimitの10倍, 0なら打ち切らない
+        :param frozen_ratio 冷え切ったとみなす1ステップの受理率. これ以上の受理率では最良のコストが更新されなくても打ち切らない
+        :param time_limit 実行時間の上限(秒). 省略した場合は制限しない
+        """
+        self._initial_t = initial_t
+        self._final_t = final_t
+        self._cool_rate = cool_rate
+        self._limit = limit
+        self._adaptive = adaptive
+        self._window = 10 * limit if window is None else window
+        self._frozen_ratio = frozen_ratio
+        self._time_limit = time_limit
+        self._t = initial_t
+        self._best_cost = math.inf
+        self._trial_count = 0
+        self._improved_trial = 0
+        self._step_trial_count = 0
+        self._step_accept_count = 0
+
+    @property
+    def t(self):
+        return self._t
+
+    @property
+    def limit(self):
+        return self._limit
+
+    @property
+    def trial_count(self):
+        return self._trial_count
+
+    def schedule(self, initial_cost):
+        """
+        各ステップの温度を順に返すジェネレータ
+        呼び出し側は返された温度でlimit回の試行を行い, 各試行の受理判定にacceptを用いる
+
+        :param initial_cost 初期解のコスト
+        """
+        start = time.time()
+        self._t = self._initial_t
+        self._best_cost = initial_cost
+        self._trial_count = self._improved_trial = 0
+        while self._t > self._final_t:
+            self._step_trial_count = self._step_accept_count = 0
+            yield self._t
+
+            if self.__is_converged():
+                return
+            if self._time_limit is not None and time.time() - start >= self._time_limit:
+                return
+            self._t *= self.__cool_rate()
+
+    def accept(self, current_cost, new_cost):
+        """
+        メトロポリス基準で新しい解を受理するかを判定する
+
+        :param current_cost 現在の解のコスト
+        :param new_cost 新しい解のコスト
+        """
+        self._trial_count += 1
+        self._step_trial_count += 1
+        delta = new_cost - current_cost
+        # コストがnanの場合も改悪とみなして判定する
+        if not delta <= 0 and not random.random() < math.exp(- delta / self._t):
+            return False
+
+        self._step_accept_count += 1
+        if new_cost < self._best_cost:
+            self._best_cost = new_cost
+            self._improved_trial = self._trial_count
+
+        return True
+
+    def __is_converged(self):
+        """
+        このステップの受理率がfrozen_ratioを下回り, 最良のコストがwindow回の試行の間更新されていなければTrue
+        高温や同じコストの解の間を移動している間は, 最良のコストが更新されなくても後で改善することがあるため打ち切らない
+        """
+        if self._window <= 0 or self._step_trial_count == 0:
+            return False
+        if self._step_accept_count / self._step_trial_count >= self._frozen_ratio:
+            return False
+
+        return self._trial_count - self._improved_trial >= self._window
+
+    def __cool_rate(self):
+        """
+        このステップの受理率に応じた冷却率を返す
+        """
+        if not self._adaptive or self._step_trial_count == 0:
+            return self._cool_rate
+
+        ratio = self._step_accept_count / self._step_trial_count
+        if ratio > 0.9 or ratio < 0.01:
+            return self._cool_rate ** 4
+
+        return self._cool_rate
@@ -3,116 +3,275 @@ import heapq
 from ..graph import Node
 
 
+class _Cell:
+    """
+    優先度付きキューに積む点
+    コストが等しい点どうしには順序を付けず, 取り出す順序はヒープの構造のみで決まる(Nodeを積んでいたときと同じ)
+    """
+    __slots__ = ("index",)
+
+    def __init__(self, index):
+        self.index = index
+
+    def __lt__(self, other):
+        return False
+
+
 class BestFirstSearch:
-    def __init__(self, src, dst, count, grid, used_node_array, size, space, init=False):
+    """
+    格子上の2点間の経路を探索する
+    探索中の点はLatticeの添字で表し, 占有状況と混雑度は添字で引く1次元の配列を参照する
+    Nodeは探索で得られた経路に対してのみ生成する
+    """
+    def __init__(self, src, dst, count, grid, used_node_array, size, lattice, init=False, a_star=False,
+                 history=None, bidirectional=False):
+        """
+        コンストラクタ
+
+        :param src 始点の接合部
+        :param dst 終点の接合部
+        :param count 引き剥がしの反復回数. 混雑によるコストの重みに用いる
+        :param grid 各点を通る経路の数の配列(添字はlatticeによる). 探索中は参照のみ行う
+        :param used_node_array 経路として利用できない点を1とした配列(添字はlatticeによる)
+        :param size 探索する座標の範囲
+        :param lattice 座標と添字の対応
+        :param init 混雑を考慮しない初期経路の探索ならTrue
+        :param a_star マンハッタン距離を下界とするA*探索を行うならTrue
+        :param history 各点の履歴コストの配列(添字はlatticeによる). 指定した場合は進む先の点の履歴コストを加える
+        :param bidirectional 始点と終点の両側から探索するならTrue. コストが一様な初期経路の探索(init)でのみ用いる
+        """
         self._src = src
         self._dst = dst
         self._rate = pow(1.05, count)
         self._grid = grid
         self._used_node_array = used_node_array
-        self._space = space
+        self._lattice = lattice
         self._size = size
         self._init = init
+        self._a_star = a_star
+        self._history = history
+        self._bidirectional = bidirectional and init
+        self._expanded_count = 0
+        self._src_index = lattice.index(src.x, src.y, src.z)
+        self._dst_index = lattice.index(dst.x, dst.y, dst.z)
+
+        stride_x, stride_y, stride_z = lattice.stride
+        # 隣接する点への(軸, 座標の増分, 添字の増分). 順序は+x, +y, -x, -y, +z, -z
+        self._direction_list = ((0, 2, 2 * stride_x), (1, 2, 2 * stride_y),
+                                (0, -2, -2 * stride_x), (1, -2, -2 * stride_y),
+                                (2, 2, 2 * stride_z), (2, -2, -2 * stride_z))
+
+    @property
+    def expanded_count(self):
+        """
+        探索で展開したノードの数
+        """
+        return self._expanded_count
 
     def search(self):
+        """
+        始点から終点までの経路(ノードの配列)を返す. 終点に到達できなければNoneを返す
+        """
+        if self._bidirectional:
+            return self.__bidirectional_search()
+        if self._a_star:
+            return self.__a_star_search()
+
         queue = []
-        # keyは探索済みノード. valueはその前のノード
-        visited_node = {self._src: self._src}
-        heapq.heappush(queue, (0, self._src))
+        # keyは探索済みの点の添字. valueはその前の点の添字
+        visited_node = {self._src_index: self._src_index}
+        heapq.heappush(queue, (0, _Cell(self._src_index)))
         while len(queue) != 0:
-            current_node_cost, current_node = heapq.heappop(queue)
-            if self.__is_dst_node(current_node):
+            current_node_cost, cell = heapq.heappop(queue)
+            current_node = cell.index
+            if current_node == self._dst_index:
                 break
+            self._expanded_count += 1
 
             for next_node in self.__expand_node(current_node):
                 if next_node not in visited_node:
                     visited_node[next_node] = current_node
                     cost = self.__evaluate(current_node_cost, visited_node[current_node], current_node, next_node)
-                    heapq.heappush(queue, (cost, next_node))
+                    heapq.heappush(queue, (cost, _Cell(next_node)))
 
         route = self.__create_route(visited_node)
         return route
 
-    def __create_route(self, visited_node):
-        route = []
-        node = self._dst
-        if self._grid:
-            self._grid[node.x + self._space][node.y + self._space][node.z + self._space] += 1
-        while not self.__is_src_node(node):
-            route.append(node)
-            node = visited_node[node]
-            if self._grid:
-                self._grid[node.x + self._space][node.y + self._space][node.z + self._space] += 1
-        route.append(node)
-        route.reverse()
+    def __a_star_search(self):
+        """
+        終点までのマンハッタン距離を下界とするA*探索
+        1歩(座標の差2)のコストは混雑による加算を除いて1.0であるため, 距離/2が許容的かつ単調なヒューリスティックになる
+        展開したノードは確定させ, より小さいコストで到達できるノードは前のノードを付け替える
+        """
+        queue = []
+        # keyは到達済みの点の添字. valueはその前の点の添字
+        visited_node = {self._src_index: self._src_index}
+        cost_map = {self._src_index: 0.0}
+        closed_set = set()
+        heuristic = self.__heuristic(self._src_index)
+        heapq.heappush(queue, (heuristic, heuristic, _Cell(self._src_index)))
+        while len(queue) != 0:
+            _, _, cell = heapq.heappop(queue)
+            current_node = cell.index
+            if current_node in closed_set:
+                continue
+            if current_node == self._dst_index:
+                break
+            closed_set.add(current_node)
+            self._expanded_count += 1
+
+            current_node_cost = cost_map[current_node]
+            for next_node in self.__expand_node(current_node):
+                if next_node in closed_set:
+                    continue
+                cost = self.__evaluate(current_node_cost, visited_node[current_node], current_node, next_node)
+                if next_node not in cost_map or cost < cost_map[next_node]:
+                    visited_node[next_node] = current_node
+                    cost_map[next_node] = cost
+                    heuristic = self.__heuristic(next_node)
+                    heapq.heappush(queue, (cost + heuristic, heuristic, _Cell(next_node)))
 
+        route = self.__create_route(visited_node)
         return route
 
-    def __is_src_node(self, node):
-        if node.x == self._src.x and node.y == self._src.y and node.z == self._src.z:
-            return True
+    def __bidirectional_search(self):
+        """
+        始点側と終点側から1段ずつ幅優先探索を進め, 両側の探索が出会った点で経路をつなぐ
+        各段ではより小さい側を展開し, 段の中で見つかった出会いのうち最も短い経路を選ぶため, 最短経路が得られる
+        """
+        if self._src_index == self._dst_index:
+            return self.__create_route({self._src_index: self._src_index})
 
-        return False
+        # 始点側はkeyの点の前の点を, 終点側はkeyの点の次の点を記録する
+        forward_node, backward_node = {self._src_index: self._src_index}, {self._dst_index: self._dst_index}
+        forward_dist, backward_dist = {self._src_index: 0}, {self._dst_index: 0}
+        forward_frontier, backward_frontier = [self._src_index], [self._dst_index]
+        meeting = None
+        while meeting is None and forward_frontier and backward_frontier:
+            is_forward = len(forward_frontier) <= len(backward_frontier)
+            if is_forward:
+                frontier, node_map, dist_map, other_dist = \
+                    forward_frontier, forward_node, forward_dist, backward_dist
+                passable = self._dst_index
+            else:
+                frontier, node_map, dist_map, other_dist = \
+                    backward_frontier, backward_node, backward_dist, forward_dist
+                passable = self._src_index
 
-    def __is_dst_node(self, node):
-        if node.x == self._dst.x and node.y == self._dst.y and node.z == self._dst.z:
-            return True
+            next_frontier = []
+            best = None
+            for current_node in frontier:
+                self._expanded_count += 1
+                for next_node in self.__expand_node(current_node, passable):
+                    if next_node in other_dist:
+                        length = dist_map[current_node] + 1 + other_dist[next_node]
+                        if best is None or length < best:
+                            best, meeting = length, (current_node, next_node)
+                        continue
+                    if next_node not in node_map:
+                        node_map[next_node] = current_node
+                        dist_map[next_node] = dist_map[current_node] + 1
+                        # 使用済みの点(終点と始点)からは展開しない
+                        if not self._used_node_array[next_node]:
+                            next_frontier.append(next_node)
 
-        return False
+            if is_forward:
+                forward_frontier = next_frontier
+            else:
+                backward_frontier = next_frontier
+
+        if meeting is None:
+            return None
+
+        # 出会った辺の始点側の点と終点側の点
+        forward_end, backward_end = meeting if is_forward else meeting[::-1]
+        visited_node = {}
+        index = forward_end
+        while index != self._src_index:
+            visited_node[index] = forward_node[index]
+            index = forward_node[index]
+        visited_node[backward_end] = forward_end
+        index = backward_end
+        while index != self._dst_index:
+            visited_node[backward_node[index]] = index
+            index = backward_node[index]
+
+        return self.__create_route(visited_node)
+
+    def __heuristic(self, index):
+        """
+        添字indexの点から終点までのコストの下界
+
+        :param index 対象となる点の添字
+        """
+        x, y, z = self._lattice.position(index)
+        return (abs(x - self._dst.x) + abs(y - self._dst.y) + abs(z - self._dst.z)) / 2.0
+
+    def __create_route(self, visited_node):
+        """
+        終点から前の点を辿って経路を作る
+        始点と終点は与えられた接合部を, 途中の点は新しいNodeを用いる
+
+        :param visited_node 探索済みの点の添字からその前の点の添字への辞書
+        """
+        if self._dst_index not in visited_node:
+            return None
+
+        route = []
+        index = self._dst_index
+        while index != self._src_index:
+            route.append(self._dst if index == self._dst_index else Node(*self._lattice.position(index)))
+            index = visited_node[index]
+        route.append(self._src)
+        route.reverse()
+
+        return route
 
     def __evaluate(self, current_node_cost, previous_node, current_node, next_node):
         if self._init:
             return current_node_cost + 1.0
 
+        grid = self._grid
         point = current_node_cost + 1.0
         t, c = 2.0, 20.0
         # touch -> touch
-        if self._grid[previous_node.x + self._space][previous_node.y + self._space][previous_node.z + self._space] > 0.0 \
-                and self._grid[current_node.x + self._space][current_node.y + self._space][current_node.z + self._space] > 0.0:
+        if grid[previous_node] > 0 and grid[current_node] > 0:
             point += self._rate * t
         # empty -> touch
-        elif self._grid[current_node.x + self._space][current_node.y + self._space][current_node.z + self._space] == 0.0 \
-                and self._grid[next_node.x + self._space][next_node.y + self._space][next_node.z + self._space] > 0.0:
+        elif grid[current_node] == 0 and grid[next_node] > 0:
             point += self._rate * t
         # cross (= empty -> touch -> empty)
-        elif self._grid[previous_node.x + self._space][previous_node.y + self._space][previous_node.z + self._space] == 0.0 \
-                and self._grid[current_node.x + self._space][current_node.y + self._space][current_node.z + self._space] > 0.0 \
-                and self._grid[next_node.x + self._space][next_node.y + self._space][next_node.z + self._space] == 0.0:
+        elif grid[previous_node] == 0 and grid[current_node] > 0 and grid[next_node] == 0:
             point += self._rate * c
 
+        if self._history is not None:
+            point += self._history[next_node]
+
         return point
 
-    def __expand_node(self, node):
-        expanded_nodes = []
-        dx = [2, 0, -2, 0, 0, 0]
-        dy = [0, 2, 0, -2, 0, 0]
-        dz = [0, 0, 0, 0, 2, -2]
+    def __expand_node(self, index, passable=None):
+        """
+        添字indexの点から移動できる隣接点の添字の配列を返す
+        範囲外の点, 間の点が使用済みの点, passable以外の使用済みの点には移動できない
 
-        for i in range(6):
-            next_node = Node(node.x + dx[i], node.y + dy[i], node.z + dz[i])
-            if not self.__is_prohibit(node, next_node):
-                expanded_nodes.append(next_node)
+        :param index 対象となる点の添字
+        :param passable 使用済みでも移動できる点の添字. 省略した場合は終点
+        """
+        if passable is None:
+            passable = self._dst_index
+        used = self._used_node_array
+        size = self._size
+        position = self._lattice.position(index)
+        expanded_nodes = []
+        for axis, step, offset in self._direction_list:
+            coordinate = position[axis] + step
+            if coordinate < size[axis][0] or coordinate > size[axis][1]:
+                continue
+            if used[index + offset // 2]:
+                continue
+            next_node = index + offset
+            if next_node != passable and used[next_node]:
+                continue
+            expanded_nodes.append(next_node)
 
         return expanded_nodes
-
-    def __is_prohibit(self, current_node, next_node):
-        if next_node.x < self._size[0][0] or next_node.x > self._size[0][1] \
-                or next_node.y < self._size[1][0] or next_node.y > self._size[1][1] \
-                or next_node.z < self._size[2][0] or next_node.z > self._size[2][1]:
-            return True
-
-        edge_x = int((current_node.x + next_node.x) / 2)
-        edge_y = int((current_node.y + next_node.y) / 2)
-        edge_z = int((current_node.z + next_node.z) / 2)
-        if self._used_node_array[edge_x + self._space][edge_y + self._space][edge_z + self._space]:
-            return True
-
-        if self._dst.x == next_node.x and self._dst.y == next_node.y and self._dst.z == next_node.z:
-            return False
-
-        if self._used_node_array[next_node.x + self._space][next_node.y + self._space][next_node.z + self._space]:
-            return True
-
-        return False
-
-
@@ -0,0 +1,123 @@
+from array import array
+
+
+class CongestionGrid:
+    """
+    格子の各点を通る経路の数を管理する
+    2本以上の経路が通る点(オーバーフロー)の数を経路の追加と削除のたびに更新し, 配線の収束を定数時間で判定する
+    混雑の交渉による再配線のために, 各点がこれまでにオーバーフローした度合い(履歴コスト)も持つ
+    """
+    def __init__(self, lattice, check_max):
+        """
+        コンストラクタ
+
+        :param lattice 座標と添字の対応
+        :param check_max オーバーフローを数える範囲. 各軸でこの座標より小さい点のみを数える
+        """
+        self._lattice = lattice
+        self._grid = array("i", [0]) * lattice.cell_count
+        self._history = array("d", [0.0]) * lattice.cell_count
+        self._overflow_count = 0
+
+        # オーバーフローを数える点を1とした配列. z方向の点は添字が連続しているため行ごとに埋める
+        self._check_mask = lattice.create_buffer()
+        (stride_x, stride_y, _), space = lattice.stride, lattice.space
+        depth = max(check_max[2] + space, 0)
+        for x in range(0, check_max[0] + space):
+            for y in range(0, check_max[1] + space):
+                start = x * stride_x + y * stride_y
+                self._check_mask[start:start + depth] = b"\x01" * depth
+
+    @property
+    def grid(self):
+        """
+        各点を通る経路の数の配列. 添字はlatticeによる
+        """
+        return self._grid
+
+    @property
+    def history(self):
+        """
+        各点の履歴コストの配列. 添字はlatticeによる
+        """
+        return self._history
+
+    @property
+    def overflow_count(self):
+        """
+        2本以上の経路が通る点の数
+        """
+        return self._overflow_count
+
+    def add(self, route):
+        """
+        経路を追加し, 経路上の点を通る経路の数を1増やす
+
+        :param route 経路上のノードの配列
+        """
+        grid, mask, lattice = self._grid, self._check_mask, self._lattice
+        for node in route:
+            index = lattice.index(node.x, node.y, node.z)
+            count = grid[index] + 1
+            grid[index] = count
+            if count == 2 and mask[index]:
+                self._overflow_count += 1
+
+    def remove(self, route):
+        """
+        経路を取り除き, 経路上の点を通る経路の数を1減らす
+
+        :param route 経路上のノードの配列
+        """
+        grid, mask, lattice = self._grid, self._check_mask, self._lattice
+        for node in route:
+            index = lattice.index(node.x, node.y, node.z)
+            count = grid[index]
+            grid[index] = count - 1
+            if count == 2 and mask[index]:
+                self._overflow_count -= 1
+
+    def is_congested(self, route):
+        """
+        経路がオーバーフローしている点を通るならTrue
+
+        :param route 経路上のノードの配列
+        """
+        grid, mask, lattice = self._grid, self._check_mask, self._lattice
+        for node in route:
+            index = lattice.index(node.x, node.y, node.z)
+            if grid[index] > 1 and mask[index]:
+                return True
+
+        return False
+
+    def congested_position_list(self, route):
+        """
+        経路上でオーバーフローしている点の, 経路中の位置の配列を返す
+
+        :param route 経路上のノードの配列
+        """
+        grid, mask, lattice = self._grid, self._check_mask, self._lattice
+        position_list = []
+        for position, node in enumerate(route):
+            index = lattice.index(node.x, node.y, node.z)
+            if grid[index] > 1 and mask[index]:
+                position_list.append(position)
+
+        return position_list
+
+    def update_history(self, route_list, increment):
+        """
+        経路が通る点のうちオーバーフローしている点の履歴コストをincrementだけ増やす. 各点は1回のみ増やす
+
+        :param route_list 経路の配列
+        :param increment 履歴コストの増分
+        """
+        grid, mask, lattice = self._grid, self._check_mask, self._lattice
+        updated_set = set()
+        for route in route_list:
+            for node in route:
+                index = lattice.index(node.x, node.y, node.z)
+                if index not in updated_set and grid[index] > 1 and mask[index]:
+                    updated_set.add(index)
+                    self._history[index] += increment
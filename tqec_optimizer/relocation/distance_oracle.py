@@ -0,0 +1,147 @@
+import math
+from collections import deque
+
+
+class DistanceOracle:
+    """
+    配線の障害物を考慮した接合部間の距離を求める
+    障害物の配列は配置ごとに作成したObstacleMapのものを参照し, 距離は(始点の座標, 障害物の版)ごとに記録して使い回す
+    """
+    def __init__(self, obstacle_map, space=1):
+        """
+        コンストラクタ
+
+        :param obstacle_map 配線に利用できない点の配列. 障害物を追加するまでは参照のみ行う
+        :param space 回路の外側に設ける配線用の余白. obstacle_mapの余白以下とする
+        """
+        self._space = space
+        self._version = 0
+        self._cache = {}
+
+        (max_x, max_y, max_z) = obstacle_map.size
+        self._size = ((-self._space, max_x + self._space),
+                      (-self._space, max_y + self._space),
+                      (-self._space, max_z + self._space))
+        self._lattice = obstacle_map.lattice
+        self._used_node_array = obstacle_map.used_node_array
+        self._is_shared = True
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def space(self):
+        return self._space
+
+    @property
+    def lattice(self):
+        return self._lattice
+
+    @property
+    def used_node_array(self):
+        """
+        経路として利用できない点を1とした配列. 添字はlatticeによる
+        """
+        return self._used_node_array
+
+    @property
+    def version(self):
+        """
+        障害物の版. 障害物を追加するたびに増える
+        """
+        return self._version
+
+    def __getstate__(self):
+        """
+        別プロセスへは障害物の配列のみを渡し, 記録した距離は渡さない
+        """
+        state = self.__dict__.copy()
+        state["_cache"] = {}
+        return state
+
+    def add_obstacle(self, x, y, z):
+        """
+        座標(x, y, z)を障害物にする. 以前の版で求めた距離は使われなくなる
+        共有している障害物の配列は書き換えず, 最初に追加するときに複製する
+
+        :param x X座標
+        :param y Y座標
+        :param z Z座標
+        """
+        if self._is_shared:
+            self._used_node_array = bytearray(self._used_node_array)
+            self._is_shared = False
+        self._used_node_array[self._lattice.index(x, y, z)] = 1
+        self._version += 1
+
+    def distance_table(self, joint_list):
+        """
+        接合部の全ての組について距離を求める. 距離はBestFirstSearchで求めた経路の長さと等しい
+
+        :param joint_list 接合部の配列
+        """
+        index_list = [self._lattice.index(joint.x, joint.y, joint.z) for joint in joint_list]
+        target_set = set(index_list)
+        dist_table = {}
+        for joint, index in zip(joint_list, index_list):
+            dist_map = self.__search(index, target_set)
+            for other, other_index in zip(joint_list, index_list):
+                if other is not joint:
+                    dist_table[(joint, other)] = dist_map.get(other_index, math.inf) * 2.0
+
+        return dist_table
+
+    def __search(self, src, target_set):
+        """
+        srcからの幅優先探索でtarget_setの各点までの歩数を求める
+        使用済みの点は目的の点としてのみ到達でき, そこからは展開しない
+
+        :param src 始点の添字
+        :param target_set 距離を求める点の添字の集合
+        """
+        key = (src, self._version)
+        if key in self._cache:
+            dist_map, resolved_set = self._cache[key]
+            if target_set <= resolved_set:
+                return dist_map
+
+        used, lattice, size = self._used_node_array, self._lattice, self._size
+        stride_x, stride_y, stride_z = lattice.stride
+        # 隣接する点への(軸, 座標の増分, 添字の増分)
+        direction_list = ((0, 2, 2 * stride_x), (0, -2, -2 * stride_x), (1, 2, 2 * stride_y),
+                          (1, -2, -2 * stride_y), (2, 2, 2 * stride_z), (2, -2, -2 * stride_z))
+        dist_map = {}
+        visited = {src: 0}
+        remain = len(target_set - {src})
+        queue = deque([src])
+        while queue and remain > 0:
+            index = queue.popleft()
+            dist = visited[index]
+            position = lattice.position(index)
+            for axis, step, offset in direction_list:
+                next_index = index + offset
+                if next_index in visited:
+                    continue
+                coordinate = position[axis] + step
+                if coordinate < size[axis][0] or coordinate > size[axis][1]:
+                    continue
+                if used[index + offset // 2]:
+                    continue
+
+                is_used = used[next_index]
+                if next_index in target_set:
+                    dist_map[next_index] = dist + 1
+                    remain -= 1
+                elif is_used:
+                    continue
+
+                visited[next_index] = dist + 1
+                if not is_used:
+                    queue.append(next_index)
+
+        dist_map[src] = 0
+        # 到達できなかった点も含めて, 問い合わせた点は全て解決済みとして記録する
+        self._cache[key] = (dist_map, target_set)
+
+        return dist_map
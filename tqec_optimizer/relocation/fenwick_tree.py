@@ -0,0 +1,104 @@
+import bisect
+
+
+class MaxFenwickTree:
+    """
+    先頭からの区間の最大値を求めるFenwick木
+    値は大きくなる方向にのみ更新できる
+    """
+    def __init__(self, size):
+        """
+        コンストラクタ
+
+        :param size 要素数
+        """
+        self._size = size
+        self._tree = [0] * (size + 1)
+
+    def update(self, index, value):
+        """
+        index番目(0始まり)の値をvalueとの最大値に更新する
+
+        :param index 更新する位置
+        :param value 値
+        """
+        index += 1
+        while index <= self._size:
+            if self._tree[index] < value:
+                self._tree[index] = value
+            index += index & -index
+
+    def query(self, index):
+        """
+        0 ~ index - 1番目の値の最大値を返す. 値が無ければ0
+
+        :param index 区間の終端(この位置は含まない)
+        """
+        result = 0
+        while index > 0:
+            if result < self._tree[index]:
+                result = self._tree[index]
+            index -= index & -index
+
+        return result
+
+
+class DominanceMaxTree:
+    """
+    2次元の点(a, b)に値を持たせ, a' < a かつ b' < b を満たす点の値の最大値を求める
+    bについてのFenwick木の各節点に, 担当する点のaの昇順の列とその上のFenwick木を持たせる
+    """
+    def __init__(self, point_list):
+        """
+        コンストラクタ
+
+        :param point_list 点(a, b)の配列. a, bはそれぞれ0 ~ 要素数 - 1の順列
+        """
+        self._size = len(point_list)
+        self._key_list = [[] for n in range(0, self._size + 1)]
+        for a, b in sorted(point_list):
+            index = b + 1
+            while index <= self._size:
+                self._key_list[index].append(a)
+                index += index & -index
+
+        self._tree_list = [[0] * (len(key_list) + 1) for key_list in self._key_list]
+
+    def update(self, a, b, value):
+        """
+        点(a, b)の値をvalueとの最大値に更新する
+
+        :param a 点のa座標
+        :param b 点のb座標
+        :param value 値
+        """
+        index = b + 1
+        while index <= self._size:
+            key_list, tree = self._key_list[index], self._tree_list[index]
+            size = len(key_list)
+            inner_index = bisect.bisect_left(key_list, a) + 1
+            while inner_index <= size:
+                if tree[inner_index] < value:
+                    tree[inner_index] = value
+                inner_index += inner_index & -inner_index
+            index += index & -index
+
+    def query(self, a, b):
+        """
+        a' < a かつ b' < b を満たす点(a', b')の値の最大値を返す. 値が無ければ0
+
+        :param a a座標の上限(この値は含まない)
+        :param b b座標の上限(この値は含まない)
+        """
+        result = 0
+        index = b
+        while index > 0:
+            tree = self._tree_list[index]
+            inner_index = bisect.bisect_left(self._key_list[index], a)
+            while inner_index > 0:
+                if result < tree[inner_index]:
+                    result = tree[inner_index]
+                inner_index -= inner_index & -inner_index
+            index -= index & -index
+
+        return result
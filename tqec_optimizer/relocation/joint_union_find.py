@@ -0,0 +1,97 @@
+class JointUnionFind:
+    """
+    モジュールの接合部(Joint)を要素とするUnion-Find
+    同じ位置の接合部を共有する交差辺を, 同じidを割り当てるべき1つのグループにまとめる
+    """
+    def __init__(self, module_list=None):
+        """
+        コンストラクタ
+
+        :param module_list 交差辺を登録するModuleの配列
+        """
+        self._parent = {}
+        self._edge_list_map = {}
+
+        if module_list is not None:
+            for module_ in module_list:
+                for joint_pair in module_.joint_pair_list:
+                    self.union(joint_pair[0], joint_pair[1], joint_pair[2])
+
+    @property
+    def group_list(self):
+        """
+        交差辺の数の降順に並べたグループの配列
+        """
+        return sorted(self._edge_list_map.values(), key=len, reverse=True)
+
+    def find(self, joint):
+        """
+        接合部が属するグループの代表を返す
+
+        :param joint 接合部
+        """
+        parent = self._parent
+        while parent[joint] is not joint:
+            parent[joint] = parent[parent[joint]]
+            joint = parent[joint]
+
+        return joint
+
+    def union(self, joint1, joint2, edge):
+        """
+        接合部の組とそれを結ぶ交差辺を登録し, 両端の接合部が属するグループを併合する
+        グループ内の交差辺は登録順に並び, 併合後はjoint1側のグループの後ろにjoint2側が続く
+
+        :param joint1 交差辺の端点
+        :param joint2 交差辺の端点
+        :param edge 交差辺
+        """
+        root1 = self.find(joint1) if joint1 in self._parent else None
+        root2 = self.find(joint2) if joint2 in self._parent else None
+
+        if root1 is None and root2 is None:
+            self._parent[joint1] = joint1
+            self._parent[joint2] = joint1
+            self._edge_list_map[joint1] = [edge]
+        elif root2 is None:
+            self._parent[joint2] = root1
+            self._edge_list_map[root1].append(edge)
+        elif root1 is None:
+            self._parent[joint1] = root2
+            self._edge_list_map[root2].append(edge)
+        else:
+            edge_list = self._edge_list_map[root1]
+            if root2 is not root1:
+                self._parent[root2] = root1
+                edge_list.extend(self._edge_list_map.pop(root2))
+            edge_list.append(edge)
+
+    def can_assign(self, cross_id_set):
+        """
+        交差辺を2本以上含むグループ全てに, 共通のidを割り当てられるかを判定する
+
+        :param cross_id_set モジュールごとの割当可能なidの集合. 変更はしない
+        """
+        # 割り当てたidを取り除いた集合は, 変更するモジュールの分だけ複製する
+        id_set = {}
+        for edge_list in self.group_list:
+            if len(edge_list) == 1:
+                break
+            module_id = edge_list[0].module_id
+            result = id_set[module_id] if module_id in id_set else cross_id_set[module_id]
+            for edge in edge_list:
+                module_id = edge.module_id
+                tmp = id_set[module_id] if module_id in id_set else cross_id_set[module_id]
+                result = result & tmp
+
+            if len(result) == 0:
+                return False
+
+            del_num = result.pop()
+            for edge in edge_list:
+                module_id = edge.module_id
+                if module_id not in id_set:
+                    id_set[module_id] = set(cross_id_set[module_id])
+                id_set[module_id].remove(del_num)
+
+        return True
@@ -0,0 +1,68 @@
+class Lattice:
+    """
+    整数座標の直方体の各点を1次元の配列の添字に対応させる
+    座標は各軸とも-spaceから最大座標+spaceまでを扱い, 占有状況などは添字で引くbytearrayやarrayに持たせる
+    """
+    def __init__(self, max_x, max_y, max_z, space):
+        """
+        コンストラクタ
+
+        :param max_x X軸方向の最大座標
+        :param max_y Y軸方向の最大座標
+        :param max_z Z軸方向の最大座標
+        :param space 最大座標の外側(と原点の手前)に設ける余白
+        """
+        self._space = space
+        self._shape = (max_x + space * 2 + 1, max_y + space * 2 + 1, max_z + space * 2 + 1)
+        self._stride = (self._shape[1] * self._shape[2], self._shape[2], 1)
+        self._cell_count = self._shape[0] * self._shape[1] * self._shape[2]
+
+    @property
+    def space(self):
+        return self._space
+
+    @property
+    def shape(self):
+        """
+        各軸の点の数
+        """
+        return self._shape
+
+    @property
+    def stride(self):
+        """
+        各軸方向に座標が1増えたときの添字の増分
+        """
+        return self._stride
+
+    @property
+    def cell_count(self):
+        return self._cell_count
+
+    def index(self, x, y, z):
+        """
+        座標(x, y, z)に対応する添字を返す
+
+        :param x X座標
+        :param y Y座標
+        :param z Z座標
+        """
+        space = self._space
+        return (x + space) * self._stride[0] + (y + space) * self._stride[1] + z + space
+
+    def position(self, index):
+        """
+        添字に対応する座標の組を返す
+
+        :param index 添字
+        """
+        x, rest = divmod(index, self._stride[0])
+        y, z = divmod(rest, self._stride[1])
+        space = self._space
+        return x - space, y - space, z - space
+
+    def create_buffer(self):
+        """
+        全ての点を0で初期化したbytearrayを返す
+        """
+        return bytearray(self._cell_count)
@@ -97,6 +97,17 @@ class Module:
     def joint_pair_list(self):
         return self._joint_pair_list
 
+    @property
+    def coordinate_list(self):
+        """
+        モジュールを構成するノードの座標を並べた平坦な配列
+        """
+        coordinate_list = []
+        for node in self._frame_node_list + self._cross_node_list:
+            coordinate_list.extend((node.x, node.y, node.z))
+
+        return coordinate_list
+
     def add_frame_node(self, node):
         self._frame_node_list.append(node)
 
@@ -147,6 +158,19 @@ class Module:
 
         self._pos = position
 
+    def restore_coordinate(self, coordinate_list):
+        """
+        coordinate_listで記録した座標をノードに書き戻し, モジュールの座標と大きさを更新する
+
+        :param coordinate_list coordinate_listプロパティで記録した座標の配列
+        """
+        index = 0
+        for node in self._frame_node_list + self._cross_node_list:
+            node.pos.set(coordinate_list[index], coordinate_list[index + 1], coordinate_list[index + 2])
+            index += 3
+
+        self.update()
+
     def update(self):
         """
         モジュールのサイズを求めて設定する
@@ -0,0 +1,71 @@
+from .lattice import Lattice
+
+
+class ObstacleMap:
+    """
+    配置の決まったグラフとモジュールから, 配線に利用できない点の配列を作成する
+    配置ごとに1度だけ作成し, 接合部間の距離の計算(DistanceOracle)と配線(Routing)で参照のみ行う
+    """
+    def __init__(self, graph, module_list, space=3):
+        """
+        コンストラクタ
+
+        :param graph グラフ
+        :param module_list Moduleの配列
+        :param space 回路の外側に設ける余白. 参照する側の探索範囲のうち最も広いものに合わせる
+        """
+        (max_x, max_y, max_z) = (0, 0, 0)
+        for node in graph.node_list:
+            max_x = max(max_x, node.x)
+            max_y = max(max_y, node.y)
+            max_z = max(max_z, node.z)
+
+        self._size = (max_x, max_y, max_z)
+        self._lattice = Lattice(max_x, max_y, max_z, space)
+        self._used_node_array = self.__create_used_node_array(graph, module_list)
+
+    @property
+    def size(self):
+        """
+        グラフのノードの各軸の最大座標
+        """
+        return self._size
+
+    @property
+    def lattice(self):
+        return self._lattice
+
+    @property
+    def used_node_array(self):
+        """
+        経路として利用できない点を1とした配列. 添字はlatticeによる
+        """
+        return self._used_node_array
+
+    def __create_used_node_array(self, graph, module_list):
+        """
+        グラフのノードとモジュールの内部の点を1とした配列を作成する
+        モジュールの内部はz方向の点の添字が連続しているため, (x, y)ごとにz方向の区間をまとめて埋める
+
+        :param graph グラフ
+        :param module_list Moduleの配列
+        """
+        lattice = self._lattice
+        used_node_array = lattice.create_buffer()
+
+        for node in graph.node_list:
+            used_node_array[lattice.index(node.x, node.y, node.z)] = 1
+
+        stride_x, stride_y, _ = lattice.stride
+        for module_ in module_list:
+            min_x, max_x = module_.inner_pos.x + 1, module_.inner_pos.x + module_.inner_width
+            min_y, max_y = module_.inner_pos.y + 1, module_.inner_pos.y + module_.inner_height
+            min_z, max_z = module_.inner_pos.z + 1, module_.inner_pos.z + module_.inner_depth
+            if min_x >= max_x or min_y >= max_y or min_z >= max_z:
+                continue
+            run = b"\x01" * (max_z - min_z)
+            for start in range(lattice.index(min_x, min_y, min_z), lattice.index(max_x, min_y, min_z), stride_x):
+                for row in range(start, start + (max_y - min_y) * stride_y, stride_y):
+                    used_node_array[row:row + len(run)] = run
+
+        return used_node_array
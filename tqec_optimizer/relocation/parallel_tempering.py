@@ -0,0 +1,265 @@
+import random
+import math
+import multiprocessing
+import time
+
+from .module_factory import ModuleFactory
+from .sequence_triple import SequenceTriple
+from .tqec_evaluator import TqecEvaluator
+from .joint_union_find import JointUnionFind
+
+from ..vector3d import Vector3D
+
+
+class Replica:
+    """
+    パラレルテンパリングの1つの系
+    Sequence-Tripleで表した配置と, その系がこれまでに見つけた最良の配置を持つ
+    """
+    def __init__(self, type_, loop_spec_list, cross_id_set):
+        """
+        コンストラクタ
+
+        :param type_ モジュールに切り出すループの種類
+        :param loop_spec_list ループの要約とインジェクターの種類の組の配列
+        :param cross_id_set モジュールごとの割当可能なidの集合
+        """
+        self._cross_id_set = cross_id_set
+        self._module_list = [ModuleFactory(type_, loop_spec, list(injector_list)).create()
+                             for loop_spec, injector_list in loop_spec_list]
+        self.__create_initial_placement()
+        self._evaluator = TqecEvaluator(self._module_list)
+        self._cost = self._evaluator.evaluate()
+        self._place = SequenceTriple(self._module_list)
+        self._place.build_permutation()
+        self._best_cost = self._cost
+        self._best_snapshot = [module_.coordinate_list for module_ in self._module_list]
+
+    @property
+    def cost(self):
+        return self._cost
+
+    @property
+    def best_cost(self):
+        return self._best_cost
+
+    @property
+    def best_snapshot(self):
+        """
+        最良の配置. モジュールごとのノード座標の配列
+        """
+        return self._best_snapshot
+
+    def run(self, t, count):
+        """
+        温度tでcount回の近傍操作を試す
+
+        :param t 温度
+        :param count 試行回数
+        """
+        for n in range(count):
+            self._place.create_neighborhood()
+            candidate = self._place.recalculate_coordinate()
+
+            if not JointUnionFind(candidate).can_assign(self._cross_id_set):
+                self._place.recover()
+                continue
+
+            new_cost = self._evaluator.update(self._place.pop_moved_module_list())
+            delta = new_cost - self._cost
+            if delta <= 0 or random.random() < math.exp(- delta / t):
+                self._cost = new_cost
+                self._place.apply()
+                if new_cost < self._best_cost:
+                    self._best_cost = new_cost
+                    self._best_snapshot = [module_.coordinate_list for module_ in candidate]
+            else:
+                self._place.recover()
+
+        return self._cost
+
+    def __create_initial_placement(self):
+        """
+        モジュールをz方向に並べた初期配置を生成する
+        """
+        new_pos = Vector3D(0, 0, 0)
+        for module_ in self._module_list:
+            module_.set_position(Vector3D(new_pos.x, new_pos.y, new_pos.z), True)
+            new_pos.incz(module_.depth)
+
+
+class ParallelTempering:
+    """
+    Sequence-Tripleによる配置に対するパラレルテンパリング(レプリカ交換法)
+    温度の異なる複数の系を独立に動かし, swap_interval回の試行ごとに隣り合う温度の系の間で温度を交換する
+    workersが2以上の場合は系を複数のプロセスに分けて持たせ, プロセス間では温度とコストのみをやり取りする
+    """
+    def __init__(self, type_, loop_spec_list, cross_id_set,
+                 temperature_list=None, swap_interval=100, round_count=100, workers=1, time_limit=None):
+        """
+        コンストラクタ
+
+        :param type_ モジュールに切り出すループの種類
+        :param loop_spec_list ループの要約とインジェクターの種類の組の配列
+        :param cross_id_set モジュールごとの割当可能なidの集合
+        :param temperature_list 各系の温度. 省略した場合はcreate_ladderで8段の温度を作る
+        :param swap_interval 温度の交換を試みる間隔(各系の試行回数)
+        :param round_count 温度の交換を試みる回数
+        :param workers 系を分けて持たせるプロセスの数
+        :param time_limit 実行時間の上限(秒). 省略した場合は制限しない
+        """
+        self._type = type_
+        self._loop_spec_list = loop_spec_list
+        self._cross_id_set = cross_id_set
+        self._temperature_list = sorted(temperature_list) if temperature_list else self.create_ladder(0.01, 100, 8)
+        self._swap_interval = swap_interval
+        self._round_count = round_count
+        self._workers = min(workers, len(self._temperature_list))
+        self._time_limit = time_limit
+        self._replica_list = []
+        self._connection_list = []
+        self._process_list = []
+        self._swap_count = 0
+
+    @staticmethod
+    def create_ladder(min_t, max_t, count):
+        """
+        min_tからmax_tまで等比に並んだcount段の温度を返す
+
+        :param min_t 最低温度
+        :param max_t 最高温度
+        :param count 段数
+        """
+        if count == 1:
+            return [min_t]
+        rate = (max_t / min_t) ** (1.0 / (count - 1))
+        return [min_t * rate ** n for n in range(count)]
+
+    def execute(self):
+        """
+        パラレルテンパリングを実行し, 全ての系を通して最もコストの小さい配置とそのコストを返す
+        配置はモジュールごとのノード座標の配列で, Module.restore_coordinateで書き戻せる
+        """
+        replica_count = len(self._temperature_list)
+        # order[k]はk番目に低い温度を担当する系の番号
+        order = list(range(replica_count))
+        start = time.time()
+        self.__start()
+        try:
+            for round_ in range(self._round_count):
+                cost_map = self.__run({order[k]: t for k, t in enumerate(self._temperature_list)})
+                self.__exchange(order, cost_map, round_ % 2)
+                if self._time_limit is not None and time.time() - start >= self._time_limit:
+                    break
+            best_cost, best_snapshot = min(self.__collect_best(), key=lambda best: best[0])
+        finally:
+            self.__stop()
+
+        print("parallel tempering: {} replicas, {} swaps".format(replica_count, self._swap_count))
+        return best_cost, best_snapshot
+
+    def __exchange(self, order, cost_map, parity):
+        """
+        隣り合う温度の系の組について, メトロポリス基準で温度を交換する
+        交換を試みる組は偶数番目からと奇数番目からを交互に選ぶ
+
+        :param order 温度ごとの担当する系の番号
+        :param cost_map 系の番号からその系の現在のコストへの辞書
+        :param parity 0なら(0, 1), (2, 3)...の組, 1なら(1, 2), (3, 4)...の組
+        """
+        for k in range(parity, len(order) - 1, 2):
+            low, high = order[k], order[k + 1]
+            delta = (1.0 / self._temperature_list[k] - 1.0 / self._temperature_list[k + 1]) \
+                * (cost_map[low] - cost_map[high])
+            if delta >= 0 or random.random() < math.exp(delta):
+                order[k], order[k + 1] = high, low
+                self._swap_count += 1
+
+    def __start(self):
+        """
+        系を生成する. workersが2以上の場合は系を持つプロセスを起動する
+        """
+        replica_count = len(self._temperature_list)
+        if self._workers <= 1:
+            self._replica_list = [Replica(self._type, self._loop_spec_list, self._cross_id_set)
+                                  for n in range(replica_count)]
+            return
+
+        for worker in range(self._workers):
+            index_list = list(range(worker, replica_count, self._workers))
+            connection, child_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=ParallelTempering._worker,
+                                              args=(child_connection, self._type, self._loop_spec_list,
+                                                    self._cross_id_set, index_list, random.getrandbits(32)),
+                                              daemon=True)
+            process.start()
+            self._connection_list.append(connection)
+            self._process_list.append(process)
+
+    def __stop(self):
+        """
+        系を持つプロセスを終了する
+        """
+        for connection in self._connection_list:
+            connection.send(("stop", None))
+        for process in self._process_list:
+            process.join()
+        self._connection_list = []
+        self._process_list = []
+
+    def __run(self, temperature_map):
+        """
+        各系を割り当てられた温度でswap_interval回動かし, 系の番号から現在のコストへの辞書を返す
+
+        :param temperature_map 系の番号から温度への辞書
+        """
+        if not self._connection_list:
+            return {index: replica.run(temperature_map[index], self._swap_interval)
+                    for index, replica in enumerate(self._replica_list)}
+
+        for connection in self._connection_list:
+            connection.send(("run", (temperature_map, self._swap_interval)))
+        cost_map = {}
+        for connection in self._connection_list:
+            cost_map.update(connection.recv())
+
+        return cost_map
+
+    def __collect_best(self):
+        """
+        系ごとの最良のコストと配置の組の配列を返す
+        """
+        if not self._connection_list:
+            return [(replica.best_cost, replica.best_snapshot) for replica in self._replica_list]
+
+        best_list = []
+        for connection in self._connection_list:
+            connection.send(("best", None))
+            best_list.extend(connection.recv())
+
+        return best_list
+
+    @staticmethod
+    def _worker(connection, type_, loop_spec_list, cross_id_set, index_list, seed):
+        """
+        別プロセスで系を保持し, 親プロセスからの指示に従って動かす
+
+        :param connection 親プロセスとの通信路
+        :param type_ モジュールに切り出すループの種類
+        :param loop_spec_list ループの要約とインジェクターの種類の組の配列
+        :param cross_id_set モジュールごとの割当可能なidの集合
+        :param index_list このプロセスが持つ系の番号の配列
+        :param seed 乱数の種
+        """
+        random.seed(seed)
+        replica_map = {index: Replica(type_, loop_spec_list, cross_id_set) for index in index_list}
+        while True:
+            command, argument = connection.recv()
+            if command == "run":
+                temperature_map, count = argument
+                connection.send({index: replica.run(temperature_map[index], count)
+                                 for index, replica in replica_map.items()})
+            elif command == "best":
+                connection.send([(replica.best_cost, replica.best_snapshot) for replica in replica_map.values()])
+            else:
+                break
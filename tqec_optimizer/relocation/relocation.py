@@ -1,33 +1,67 @@
 import random
-import math
 import time
-import copy
-from collections import defaultdict
+from collections import defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 
-from .module import Module
 from .module_factory import ModuleFactory
 from .sequence_triple import SequenceTriple
 from .allocation import Allocation
 from .tsp import TSP
 from .routing import Routing
+from .obstacle_map import ObstacleMap
 from .tqec_evaluator import TqecEvaluator
+from .annealing import Annealing
+from .joint_union_find import JointUnionFind
+from .parallel_tempering import ParallelTempering
 
 from ..vector3d import Vector3D
 from ..graph import Graph
-from ..node import Node, Joint
-from ..edge import Edge, CrossEdge
+from ..node import Node
+from ..edge import Edge
 from ..circuit_writer import CircuitWriter
 
 
+# 別プロセスでモジュールを作り直すためのループの要約. ModuleFactoryが参照する属性のみを持つ
+LoopSpec = namedtuple("LoopSpec", ["id", "cross_list", "injector_list"])
+
+
 class Relocation:
     """
     モジュールへの切断と再配置による最適化を行う
     """
-    def __init__(self, type_, loop_list, graph):
+    def __init__(self, type_, loop_list, graph, workers=1, replicas=0, swap_interval=100, time_limit=None,
+                 a_star=False, negotiated=False, bidirectional=False, corridor=None, incremental=False):
+        """
+        コンストラクタ
+
+        :param type_ モジュールに切り出すループの種類(primal or dual)
+        :param loop_list ループの配列
+        :param graph グラフ
+        :param workers 並列に実行する焼きなましの数. 2以上の場合はプロセスを分けて実行し, ネットごとの接続順序もこの数のプロセスで求める
+        :param replicas 1以上の場合は焼きなましの代わりにこの数の系でパラレルテンパリングを行う
+        :param swap_interval パラレルテンパリングで温度の交換を試みる間隔
+        :param time_limit 各焼きなましの実行時間の上限(秒). 省略した場合は制限しない
+        :param a_star 配線の経路探索にA*探索を用いるならTrue
+        :param negotiated 配線の引き剥がし再配線を, 混雑している経路のみを対象とした交渉的な方法で行うならTrue
+        :param bidirectional 配線の初期経路を始点と終点の両側からの探索で求めるならTrue
+        :param corridor 配線の経路探索を始点と終点を囲む直方体をこの幅だけ広げた範囲から始める. 省略した場合は全体を探索する
+        :param incremental 配線の引き剥がし再配線で, 混雑していない経路を残し混雑している区間のみを探索し直すならTrue
+        """
         self._type = type_
+        self._workers = workers
+        self._replicas = replicas
+        self._swap_interval = swap_interval
+        self._time_limit = time_limit
+        self._a_star = a_star
+        self._negotiated = negotiated
+        self._bidirectional = bidirectional
+        self._corridor = corridor
+        self._incremental = incremental
         self._loop_list = loop_list
         self._graph = graph
         self._cross_id_set = {}
+        self._loop_spec_list = []
         self._joint_pair_list = []
         self._injector_list = defaultdict(list)
         self._var_node_count = 0
@@ -42,10 +76,20 @@ class Relocation:
         Sequence-Tripleを用いたSAによる再配置を行う
         """
         # create module list
+        # ModuleFactoryはインジェクターの配列を消費するため, 先に複製しておく
+        self._loop_spec_list = [(LoopSpec(loop.id, tuple(loop.cross_list),
+                                          tuple(edge.category for edge in loop.injector_list)),
+                                 tuple(self._injector_list[loop.id]))
+                                for loop in self._loop_list if loop.type == self._type]
         module_list = [ModuleFactory(self._type, loop, self._injector_list[loop.id]).create()
                        for loop in self._loop_list if loop.type == self._type]
         self._cross_id_set = {module_.id: set(module_.cross_id_list) for module_ in module_list}
 
+        # 切り出すループがなければ再配置するものがないため, 変形後のグラフをそのまま返す
+        if len(module_list) == 0:
+            print("no {} loop to relocate".format(self._type))
+            return self._graph
+
         start = time.time()
         # 各モジュールの配置決定
         result = self.__sa_relocation(module_list)
@@ -57,7 +101,7 @@ class Relocation:
         start = time.time()
 
         # 各辺に対するidの割当を決定
-        Allocation(result, self._cross_id_set).execute()
+        Allocation(result, self._cross_id_set, self._time_limit).execute()
         elapsed_time = time.time() - start
         print("allocation is completed")
         # print("Label割当所要時間: {}".format(elapsed_time))
@@ -65,14 +109,18 @@ class Relocation:
         graph = self.__to_graph(result)
 
         # 各辺の接合部の接続割当を決定
-        route_pair = TSP(graph, result).search()
+        # 障害物の配列は配置ごとに1度だけ作成し, 接続割当と配線で共有する
+        obstacle_map = ObstacleMap(graph, result)
+        route_pair = TSP(graph, result, self._time_limit, workers=self._workers, obstacle_map=obstacle_map).search()
         elapsed_time = time.time() - start
         print("TSP is completed")
         # print("接続部割当所要時間: {}".format(elapsed_time))
         start = time.time()
 
         # 各ネットの結ぶ経路の決定
-        Routing(graph, result, route_pair).execute()
+        Routing(graph, result, route_pair, self._a_star, self._negotiated,
+                bidirectional=self._bidirectional, corridor=self._corridor,
+                incremental=self._incremental, obstacle_map=obstacle_map).execute()
         elapsed_time = time.time() - start
         print("routing is completed")
         # print("配線所要時間: {}".format(elapsed_time))
@@ -85,43 +133,116 @@ class Relocation:
     def __sa_relocation(self, module_list):
         """
         Simulated Annealingによる再配置を行う
+        workersが2以上の場合は乱数の種を変えた焼きなましを別プロセスで実行し, 最もコストの小さい配置を採用する
+        replicasが1以上の場合はパラレルテンパリングで配置を求める
+
         :param module_list Moduleの配列
         """
-        initial_t = 100
-        final_t = 0.01
-        cool_rate = 0.99
-        limit = 100
-        count = 0
-
-        self.__create_initial_placement(module_list)
-        current_cost = TqecEvaluator(module_list).evaluate()
+        # モジュールが1つなら入れ替える相手がないため, 初期配置をそのまま使う
+        if len(module_list) <= 1:
+            Relocation.__create_initial_placement(module_list)
+            return module_list
+
+        if self._replicas > 0:
+            temperature_list = ParallelTempering.create_ladder(0.01, 100, self._replicas)
+            cost, snapshot = ParallelTempering(self._type, self._loop_spec_list, self._cross_id_set,
+                                               temperature_list, self._swap_interval,
+                                               workers=self._workers, time_limit=self._time_limit).execute()
+            self.__restore_snapshot(module_list, snapshot)
+            return module_list
+
+        if self._workers <= 1:
+            return self.__anneal(module_list, self._cross_id_set, self._time_limit)
+
+        seed_list = [random.getrandbits(32) for n in range(self._workers)]
+        with ProcessPoolExecutor(max_workers=self._workers) as executor:
+            result_list = list(executor.map(Relocation._anneal_worker,
+                                            repeat(self._type), repeat(self._loop_spec_list),
+                                            repeat(self._cross_id_set), seed_list, repeat(self._time_limit)))
+
+        cost, snapshot = min(result_list, key=lambda result: result[0])
+        self.__restore_snapshot(module_list, snapshot)
+        return module_list
+
+    @staticmethod
+    def _anneal_worker(type_, loop_spec_list, cross_id_set, seed, time_limit=None):
+        """
+        プロセスプール上で実行する焼きなまし
+        モジュールはループの要約から作り直し, 結果はコストとノード座標の平坦な配列として返す
+
+        :param type_ モジュールに切り出すループの種類
+        :param loop_spec_list ループの要約とインジェクターの種類の組の配列
+        :param cross_id_set モジュールごとの割当可能なidの集合
+        :param seed 乱数の種
+        :param time_limit 実行時間の上限(秒)
+        """
+        random.seed(seed)
+        module_list = [ModuleFactory(type_, loop_spec, list(injector_list)).create()
+                       for loop_spec, injector_list in loop_spec_list]
+        Relocation.__anneal(module_list, cross_id_set, time_limit)
+
+        return TqecEvaluator(module_list).evaluate(), Relocation.__take_snapshot(module_list)
+
+    @staticmethod
+    def __anneal(module_list, cross_id_set, time_limit=None):
+        """
+        Sequence-Tripleを用いた焼きなましを1回実行する
+
+        :param module_list Moduleの配列
+        :param cross_id_set モジュールごとの割当可能なidの集合
+        :param time_limit 実行時間の上限(秒)
+        """
+        annealing = Annealing(cool_rate=0.99, time_limit=time_limit)
+
+        Relocation.__create_initial_placement(module_list)
+        evaluator = TqecEvaluator(module_list)
+        current_cost = evaluator.evaluate()
         place = SequenceTriple(module_list)
         place.build_permutation()
-        t = initial_t
-        result = module_list
-        while t > final_t:
-            for n in range(limit):
-                count += 1
+        best_cost, best_snapshot = current_cost, Relocation.__take_snapshot(module_list)
+        for t in annealing.schedule(current_cost):
+            for n in range(annealing.limit):
                 place.create_neighborhood()
                 candidate = place.recalculate_coordinate()
 
-                if not self.__is_validate(candidate, self._cross_id_set):
+                if not JointUnionFind(candidate).can_assign(cross_id_set):
                     place.recover()
                     continue
 
-                new_cost = TqecEvaluator(candidate).evaluate()
+                new_cost = evaluator.update(place.pop_moved_module_list())
 
-                if self.__should_change(new_cost - current_cost, t):
+                if annealing.accept(current_cost, new_cost):
                     current_cost = new_cost
                     place.apply()
-                    if t < 1.0:
-                        result = self.__deep_copy_module_list(candidate)
+                    if new_cost < best_cost:
+                        best_cost, best_snapshot = new_cost, Relocation.__take_snapshot(candidate)
                 else:
                     place.recover()
-            t *= cool_rate
 
-        # print("試行回数: {}".format(count))
-        return result
+        # print("試行回数: {}".format(annealing.trial_count))
+        # 最後に受理した配置が最良とは限らないため, 最良の配置に戻す
+        Relocation.__restore_snapshot(module_list, best_snapshot)
+        return module_list
+
+    @staticmethod
+    def __take_snapshot(module_list):
+        """
+        配置をモジュールごとのノード座標の配列として記録する
+
+        :param module_list Moduleの配列
+        """
+        return [module_.coordinate_list for module_ in module_list]
+
+    @staticmethod
+    def __restore_snapshot(module_list, snapshot):
+        """
+        記録した配置をモジュールに書き戻す
+
+        :param module_list Moduleの配列(記録した時と同じ順序)
+        :param snapshot __take_snapshotで記録した配置
+        """
+        for module_, coordinate_list in zip(module_list, snapshot):
+            module_.restore_coordinate(coordinate_list)
 
     @staticmethod
     def __create_initial_placement(module_list):
@@ -136,66 +257,6 @@ class Relocation:
             module_.set_position(Vector3D(new_pos.x, new_pos.y, new_pos.z), True)
             new_pos.incz(module_.depth)
 
-    @staticmethod
-    def __should_change(delta, t):
-        if delta <= 0:
-            return 1
-        if random.random() < math.exp(- delta / t):
-            return 1
-        return 0
-
-    @staticmethod
-    def __is_validate(module_list, cross_id_set):
-        edge_map = {}
-        connect_edge = defaultdict(list)
-        for module_ in module_list:
-            for joint_pair in module_.joint_pair_list:
-                joint1, joint2 = joint_pair[0], joint_pair[1]
-                edge = joint_pair[2]
-
-                if joint1 in edge_map and joint2 in edge_map:
-                    connect_edge[edge_map[joint1]].extend(connect_edge[edge_map[joint2]])
-                    connect_edge[edge_map[joint1]].append(edge)
-                    del_edge = edge_map[joint2]
-
-                    for edge in connect_edge[edge_map[joint2]]:
-                        node1, node2 = edge.node1, edge.node2
-                        edge_map[node1] = edge_map[joint1]
-                        edge_map[node2] = edge_map[joint1]
-
-                    del connect_edge[del_edge]
-
-                elif joint1 in edge_map:
-                    edge_map[joint2] = edge_map[joint1]
-                    connect_edge[edge_map[joint1]].append(edge)
-
-                elif joint2 in edge_map:
-                    edge_map[joint1] = edge_map[joint2]
-                    connect_edge[edge_map[joint2]].append(edge)
-
-                else:
-                    edge_map[joint1] = edge
-                    edge_map[joint2] = edge
-                    connect_edge[edge].append(edge)
-
-        id_set = copy.deepcopy(cross_id_set)
-        for key_edge, edge_list in sorted(connect_edge.items(), key=lambda x: len(x[1]), reverse=True):
-            if len(edge_list) == 1:
-                break
-            result = id_set[edge_list[0].module_id]
-            for edge in edge_list:
-                tmp = id_set[edge.module_id]
-                result = result & tmp
-
-            if len(result) == 0:
-                return False
-
-            del_num = result.pop()
-            for edge in edge_list:
-                id_set[edge.module_id].remove(del_num)
-
-        return True
-
     def __to_graph(self, module_list):
         """
         モジュールを構成するノードと辺の情報をもとにグラフクラスを作成する
@@ -247,50 +308,6 @@ class Relocation:
                             candidate_edge = edge
                 candidate_edge.set_category(category)
 
-    @staticmethod
-    def __deep_copy_module_list(module_list):
-        result = []
-        for m in module_list:
-            module_ = Module(m.id)
-
-            # set frame edge
-            added_node = {}
-            for edge in m.frame_edge_list:
-                node1 = added_node[edge.node1] if edge.node1 in added_node \
-                    else Node(edge.node1.x, edge.node1.y, edge.node1.z, edge.node1.id, edge.node1.type)
-                node2 = added_node[edge.node2] if edge.node2 in added_node \
-                    else Node(edge.node2.x, edge.node2.y, edge.node2.z, edge.node2.id, edge.node2.type)
-                frame_edge = Edge(node1, node2, edge.category, m.id)
-                module_.add_frame_edge(frame_edge)
-                if edge.node1 not in added_node:
-                    added_node[edge.node1] = node1
-                if edge.node2 not in added_node:
-                    added_node[edge.node2] = node2
-
-            # set cross edge
-            for joint_pair in m.joint_pair_list:
-                joint1 = Joint(joint_pair[0].x, joint_pair[0].y, joint_pair[0].z, joint_pair[0].id, joint_pair[0].type)
-                joint2 = Joint(joint_pair[1].x, joint_pair[1].y, joint_pair[1].z, joint_pair[1].id, joint_pair[1].type)
-                cross_edge = CrossEdge(joint1, joint2, "edge", joint_pair[2].id, joint_pair[2].module_id)
-                module_.add_cross_node(joint1)
-                module_.add_cross_node(joint2)
-                module_.add_cross_edge(cross_edge)
-                module_.add_joint_pair((joint1, joint2, cross_edge))
-
-            # set id set
-            for id_ in m.cross_id_list:
-                m.add_cross_id(id_)
-
-            # set size and pos
-            module_.set_inner_size(m.inner_width, m.inner_height, m.inner_depth)
-            module_.set_size(m.width, m.height, m.depth)
-            module_.set_inner_position(Vector3D(m.inner_pos.x, m.inner_pos.y, m.inner_pos.z))
-            module_.set_position(Vector3D(m.pos.x, m.pos.y, m.pos.z))
-
-            result.append(module_)
-
-        return result
-
     @staticmethod
     def __new__node(node):
         node = Node(node.x, node.y, node.z, node.id, node.type)
@@ -1,6 +1,8 @@
 from collections import defaultdict
 
 from .best_first_search import BestFirstSearch
+from .congestion_grid import CongestionGrid
+from .obstacle_map import ObstacleMap
 
 from ..node import Node
 from ..edge import Edge
@@ -10,62 +12,254 @@ class Routing:
     """
     タッチアンドクロス法を用いて経路を決定する
     """
-    def __init__(self, graph, module_list, route_pair):
+    def __init__(self, graph, module_list, route_pair, a_star=False, negotiated=False, history_increment=1.0,
+                 bidirectional=False, corridor=None, incremental=False, obstacle_map=None):
+        """
+        コンストラクタ
+
+        :param graph グラフ
+        :param module_list Moduleの配列
+        :param route_pair 接続すべき接合部の組の辞書
+        :param a_star 初期経路の探索にマンハッタン距離を下界とするA*探索を用いるならTrue
+        :param negotiated 混雑している経路のみを引き剥がし, 履歴コストを用いて交渉的に再配線するならTrue
+        :param history_increment 交渉的な再配線で, オーバーフローした点の履歴コストを反復ごとに増やす量
+        :param bidirectional 初期経路を始点と終点の両側からの探索で求めるならTrue
+        :param corridor 始点と終点を囲む直方体をこの幅だけ広げた範囲から探索する. 省略した場合は全体を探索する
+        :param incremental 引き剥がし後の再配線で混雑していない経路を残し, 混雑している区間のみを探索し直して元の経路につなぐならTrue
+        :param obstacle_map 配線に利用できない点の配列. 余白は3以上とし, 省略した場合はgraphとmodule_listから作成する
+        """
         self._graph = graph
         self._module_list = module_list
         self._route_pair = route_pair
+        self._a_star = a_star
+        self._negotiated = negotiated
+        self._history_increment = history_increment
+        self._bidirectional = bidirectional
+        self._corridor = corridor
+        self._incremental = incremental
+        self._expanded_count = 0
+
+        if corridor is not None and corridor < 1:
+            raise ValueError("corridor must be 1 or more: {}".format(corridor))
         self._var_node_count = graph.var_node_count
         self._space = 3
         self._size_table = {}
 
-        (max_x, max_y, max_z) = (0, 0, 0)
-        for node in self._graph.node_list:
-            max_x = max(max_x, node.x)
-            max_y = max(max_y, node.y)
-            max_z = max(max_z, node.z)
-
-        self._size = (max_x, max_y, max_z)
+        if obstacle_map is None:
+            obstacle_map = ObstacleMap(graph, module_list, self._space)
+        self._size = obstacle_map.size
+        self._lattice = obstacle_map.lattice
+        # 障害物の配列は参照のみ行う
+        self._used_node_array = obstacle_map.used_node_array
         self.__create_size_table()
-        self.__create_used_node_array(max_x + self._space, max_y + self._space, max_z + self._space)
 
-        self._grid = [[[0
-                        for z in range(0, int(max_z + self._space * 2) + 1)]
-                       for y in range(0, int(max_y + self._space * 2) + 1)]
-                      for x in range(0, int(max_x + self._space * 2) + 1)]
+        # 各点を通る経路の数. 収束判定は最大座標より手前の点のみで行う
+        self._grid = CongestionGrid(self._lattice, self._size)
 
     def execute(self):
         routes = defaultdict(list)
-        # 初期経路
+        # 初期経路. 混雑を考慮しないためA*探索でも最短経路が得られる
+        # 引き剥がし後の探索にA*探索を用いると経路が直線に偏り, 収束までの反復が増えるため従来の探索を用いる
+        routed = True
         for index, (src, dst) in enumerate(self._route_pair.items(), start=1):
-            route = BestFirstSearch(src, dst,
-                                    1,
-                                    self._grid,
-                                    self._used_node_array,
-                                    self._size_table[0],
-                                    self._space,
-                                    True).search()
-            routes[index] = route
+            routed = self.__add_route(index, routes, self.__search(src, dst, 0, True)) and routed
 
+        if not routed:
+            print("routing failed")
+            count = 0
+        elif self._negotiated:
+            count = self.__negotiate(routes)
+        else:
+            count = self.__rip_up_all(routes)
+
+        print("routing: {} nodes expanded in {} rip-up rounds".format(self._expanded_count, count))
+        self.__create_route(routes)
+
+    @property
+    def expanded_count(self):
+        """
+        全ての経路探索で展開したノードの数
+        """
+        return self._expanded_count
+
+    def __rip_up_all(self, routes):
+        """
+        混雑が解消するまで全ての経路の引き剥がしと再配線を繰り返し, 反復回数を返す
+
+        :param routes indexをkeyとしたrouteのdict
+        """
         # 経路決定まで引き剥がしをlimitを限度に繰り返す
         update = self.__check()
         count, limit = 0, 699
+        incremental = self._incremental
         while update:
             count += 1
+            overflow_count = self._grid.overflow_count
             for index, (src, dst) in enumerate(self._route_pair.items(), start=1):
+                if incremental:
+                    # 他の経路の再配線によって混雑が解消していれば引き剥がさない
+                    if self._grid.is_congested(routes[index]) and not self.__repair(index, routes, count):
+                        print("routing failed")
+                        return count
+                    continue
                 self.__clear(index, routes)
-                route = BestFirstSearch(src, dst,
-                                        count,
-                                        self._grid,
-                                        self._used_node_array,
-                                        self._size_table[int(count/100)],
-                                        self._space).search()
-                routes[index] = route
+                if not self.__add_route(index, routes, self.__search(src, dst, count)):
+                    print("routing failed")
+                    return count
+            # 混雑している区間のみの再配線でオーバーフローが減らなければ, 次の反復では全ての経路を引き剥がす
+            incremental = self._incremental and self._grid.overflow_count < overflow_count
             update = self.__check()
             if count == limit:
                 print("routing failed")
                 break
 
-        self.__create_route(routes)
+        return count
+
+    def __negotiate(self, routes):
+        """
+        混雑の交渉(PathFinder)による引き剥がしと再配線を行い, 反復回数を返す
+        各反復ではオーバーフローしている点を通る経路のみを引き剥がして再配線し, それらの点の履歴コストを増やす
+        混雑度によるコスト(タッチアンドクロス)は従来の探索と同じ評価を用い, 履歴コストはそれに加える
+
+        :param routes indexをkeyとしたrouteのdict
+        """
+        pair_list = list(self._route_pair.items())
+        count, limit = 0, 699
+        while self.__check():
+            count += 1
+            congested_list = [index for index, route in routes.items() if self._grid.is_congested(route)]
+            self._grid.update_history([routes[index] for index in congested_list], self._history_increment)
+            for index in congested_list:
+                # 先に再配線した経路によって混雑が解消していれば引き剥がさない
+                if not self._grid.is_congested(routes[index]):
+                    continue
+                if self._incremental:
+                    if not self.__repair(index, routes, count, self._grid.history):
+                        print("routing failed")
+                        return count
+                    continue
+                src, dst = pair_list[index - 1]
+                self.__clear(index, routes)
+                if not self.__add_route(index, routes, self.__search(src, dst, count, history=self._grid.history)):
+                    print("routing failed")
+                    return count
+            if count == limit:
+                print("routing failed")
+                break
+
+        return count
+
+    def __repair(self, index, routes, count, history=None):
+        """
+        indexの経路のうち, オーバーフローしている点を最初に通る点から最後に通る点までの区間を探索し直す
+        区間の前後の点を始点と終点として探索した区間を元の経路につなぎ, つないだ経路が同じ点を2度通る場合はその間の閉路を除く
+        区間の経路が見つからないか, つないだ経路がまだオーバーフローしている点を通る場合は経路全体を探索し直す
+        経路全体も見つからなければFalseを返す
+
+        :param index ネット番号
+        :param routes indexをkeyとしたrouteのdict
+        :param count 引き剥がしの反復回数
+        :param history 各点の履歴コストの配列
+        """
+        route = routes[index]
+        congested_list = self._grid.congested_position_list(route)
+        first = max(congested_list[0] - 1, 0)
+        last = min(congested_list[-1] + 1, len(route) - 1)
+
+        self._grid.remove(route)
+        segment = self.__search(route[first], route[last], count, history=history)
+        if segment is not None:
+            routes[index] = self.__remove_loop(route[:first] + segment + route[last + 1:])
+            self._grid.add(routes[index])
+            if not self._grid.is_congested(routes[index]):
+                return True
+            self._grid.remove(routes[index])
+
+        return self.__add_route(index, routes, self.__search(route[0], route[-1], count, history=history))
+
+    def __add_route(self, index, routes, route):
+        """
+        探索した経路をindexの経路として記録し, 各点を通る経路の数に加える
+        経路が見つからなかった場合は空の経路を記録してFalseを返す
+
+        :param index ネット番号
+        :param routes indexをkeyとしたrouteのdict
+        :param route 探索した経路. 見つからなかった場合はNone
+        """
+        if route is None:
+            routes[index] = []
+            return False
+
+        routes[index] = route
+        self._grid.add(route)
+        return True
+
+    @staticmethod
+    def __remove_loop(route):
+        """
+        経路が同じ座標を2度通る場合に, その間の閉路を除いた経路を返す
+
+        :param route 経路上のノードの配列
+        """
+        result = []
+        # keyは座標. valueはresult中の位置
+        position_map = {}
+        for node in route:
+            key = (node.x, node.y, node.z)
+            if key in position_map:
+                for removed in result[position_map[key] + 1:]:
+                    del position_map[(removed.x, removed.y, removed.z)]
+                del result[position_map[key] + 1:]
+                continue
+            position_map[key] = len(result)
+            result.append(node)
+
+        return result
+
+    def __search(self, src, dst, count, init=False, history=None):
+        """
+        srcからdstまでの経路を探索する
+        corridorを指定した場合は始点と終点を囲む直方体を広げた範囲から探索し, 経路が無ければ広げる幅を倍にして探索し直す
+        範囲が反復回数で決まる探索範囲全体に達した場合は, その範囲の探索結果を返す
+
+        :param src 始点の接合部
+        :param dst 終点の接合部
+        :param count 引き剥がしの反復回数. 初期経路では0
+        :param init 混雑を考慮しない初期経路の探索ならTrue
+        :param history 各点の履歴コストの配列
+        """
+        size = self._size_table[int(count/100)]
+        margin = self._corridor
+        while True:
+            bound = size if margin is None else self.__create_corridor(src, dst, size, margin)
+            search = BestFirstSearch(src, dst,
+                                     max(count, 1),
+                                     self._grid.grid,
+                                     self._used_node_array,
+                                     bound,
+                                     self._lattice,
+                                     init,
+                                     init and self._a_star,
+                                     history,
+                                     init and self._bidirectional)
+            route = search.search()
+            self._expanded_count += search.expanded_count
+            if route is not None or bound == size:
+                return route
+            margin = max(1, 2 * margin)
+
+    @staticmethod
+    def __create_corridor(src, dst, size, margin):
+        """
+        始点と終点を囲む直方体を各方向にmarginだけ広げ, 探索範囲sizeに収めた範囲を返す
+
+        :param src 始点の接合部
+        :param dst 終点の接合部
+        :param size 探索範囲
+        :param margin 広げる幅
+        """
+        return tuple((max(size[axis][0], min(p, q) - margin), min(size[axis][1], max(p, q) + margin))
+                     for axis, (p, q) in enumerate(((src.x, dst.x), (src.y, dst.y), (src.z, dst.z))))
 
     def __clear(self, index, routes):
         """
@@ -74,22 +268,20 @@ class Routing:
         :param index ネット番号
         :param routes indexをkeyとしたrouteのdict
         """
-        for node in routes[index]:
-            self._grid[node.x + self._space][node.y + self._space][node.z + self._space] -= 1
-
+        self._grid.remove(routes[index])
         routes[index].clear()
 
     def __check(self):
-        for z in range(0, self._size[2] + self._space):
-            for x in range(0, self._size[0] + self._space):
-                for y in range(0, self._size[1] + self._space):
-                    if self._grid[x][y][z] > 1:
-                        return True
-
-        return False
+        """
+        最大座標より手前の範囲に, 2本以上の経路が通る点があればTrue
+        """
+        return self._grid.overflow_count > 0
 
     def __create_route(self, routes):
         for route in routes.values():
+            # 経路が見つからなかったネットは配線しない
+            if len(route) == 0:
+                continue
             id_, type_ = route[0].id, route[0].type
             node_array = []
             # 始点と終点は既にグラフに追加されているため追加しない
@@ -114,31 +306,6 @@ class Routing:
         self._size_table[5] = ((-3, self._size[0] + 3), (-3, self._size[1] + 3), (-3, self._size[2] + 1))
         self._size_table[6] = ((-3, self._size[0] + 3), (-3, self._size[1] + 3), (-3, self._size[2] + 3))
 
-    def __create_used_node_array(self, max_x, max_y, max_z):
-        """
-        経路として利用できないノードリストを作成する
-
-        :param max_x　X軸方向の最大サイズ
-        :param max_y　Y軸方向の最大サイズ
-        :param max_z　Z軸方向の最大サイズ
-        """
-        self._used_node_array = [[[False
-                                   for z in range(0, int(max_z + self._space * 2) + 1)]
-                                  for y in range(0, int(max_y + self._space * 2) + 1)]
-                                 for x in range(0, int(max_x + self._space * 2) + 1)]
-
-        for node in self._graph.node_list:
-            self._used_node_array[node.x + self._space][node.y + self._space][node.z + self._space] = True
-
-        for module_ in self._module_list:
-            min_x, max_x = module_.inner_pos.x + 1, module_.inner_pos.x + module_.inner_width
-            min_y, max_y = module_.inner_pos.y + 1, module_.inner_pos.y + module_.inner_height
-            min_z, max_z = module_.inner_pos.z + 1, module_.inner_pos.z + module_.inner_depth
-            for x in range(min_x, max_x):
-                for y in range(min_y, max_y):
-                    for z in range(min_z, max_z):
-                        self._used_node_array[x + self._space][y + self._space][z + self._space] = True
-
     def __new_node_variable(self):
         self._var_node_count += 1
         return self._var_node_count
@@ -1,5 +1,7 @@
 import random
 
+from .fenwick_tree import MaxFenwickTree, DominanceMaxTree
+
 from ..vector3d import Vector3D
 
 
@@ -12,24 +14,40 @@ class SequenceTriple:
         self._candidate_permutation1 = []
         self._candidate_permutation2 = []
         self._candidate_permutation3 = []
-        self._placed = [False for no in range(0, 100)]
         self._last_rotate = 0, None
+        self._moved_module_set = set()
+        self.__create_index()
 
-        self._module_map = {}
-        for module_ in module_list:
-            self._module_map[module_.id] = module_
+    @property
+    def candidate_permutation(self):
+        return self._candidate_permutation1, self._candidate_permutation2, self._candidate_permutation3
 
     def set_module_list(self, module_list):
         self._module_list = module_list
+        self.__create_index()
+
+    def __create_index(self):
+        """
+        モジュール番号を0から始まる連番に振り直し, 座標計算に使う配列を確保する
+        モジュール番号の大きさに依らずモジュール数分だけ確保する
+        """
+        size = len(self._module_list)
+        self._module_map = {module_.id: module_ for module_ in self._module_list}
+        self._index_map = {module_.id: no for no, module_ in enumerate(self._module_list)}
+        self._p1_index = [0] * size
+        self._p2_index = [0] * size
+
+    def pop_moved_module_list(self):
+        """
+        前回の呼び出しから位置または向きが変わったモジュールを返す
+        """
+        moved_module_list = [self._module_map[id_] for id_ in self._moved_module_set]
+        self._moved_module_set.clear()
+
+        return moved_module_list
 
     def result(self):
-        self._placed = [False for no in range(0, 100)]
-        for id_ in self._permutation3:
-            new_pos = Vector3D(self.__find_x(id_, self._permutation2),
-                               self.__find_y(id_, self._permutation1, self._permutation2),
-                               self.__find_z(id_, self._permutation1, self._permutation2))
-            self._module_map[id_].set_position(new_pos, True)
-            self._placed[id_] = True
+        self.__place(self._permutation1, self._permutation2, self._permutation3)
 
         return self._module_list
 
@@ -46,13 +64,15 @@ class SequenceTriple:
         if self._last_rotate is None:
             return
 
+        # 先頭のモジュールを回転した場合も元に戻す
         index, axis = self._last_rotate
-        if index > 0 and axis is not None:
+        if axis is not None:
             id_ = self._candidate_permutation1[index]
             rotate_module = self._module_map[id_]
             rotate_module.rotate(axis)
             rotate_module.rotate(axis)
             rotate_module.rotate(axis)
+            self._moved_module_set.add(id_)
 
     def build_permutation(self):
         # prepare
@@ -74,16 +94,52 @@ class SequenceTriple:
         self._candidate_permutation3 = self._permutation3[:]
 
     def recalculate_coordinate(self):
-        self._placed = [False for no in range(0, 100)]
-        for id_ in self._candidate_permutation3:
-            new_pos = Vector3D(self.__find_x(id_, self._candidate_permutation2),
-                               self.__find_y(id_, self._candidate_permutation1, self._candidate_permutation2),
-                               self.__find_z(id_, self._candidate_permutation1, self._candidate_permutation2))
-            self._module_map[id_].set_position(new_pos, True)
-            self._placed[id_] = True
+        self.__place(self._candidate_permutation1, self._candidate_permutation2, self._candidate_permutation3)
 
         return self._module_list
 
+    def __place(self, p1, p2, p3):
+        """
+        Sequence-Tripleから各モジュールの座標を求めて設定する
+        p3の順に配置し, 配置済みのモジュールのうち
+            x: p2で後ろにあるもの
+            y: p1で後ろ, かつp2で前にあるもの
+            z: p1とp2で前にあるもの
+        の終端の最大値をそれぞれの座標とする
+        各条件は順列上の位置に対する区間・支配点の最大値問題になるため, Fenwick木で求める
+
+        :param p1 順列1
+        :param p2 順列2
+        :param p3 順列3
+        """
+        size = len(p3)
+        index_map, p1_index, p2_index = self._index_map, self._p1_index, self._p2_index
+        for no, id_ in enumerate(p1):
+            p1_index[index_map[id_]] = no
+        for no, id_ in enumerate(p2):
+            p2_index[index_map[id_]] = no
+
+        x_tree = MaxFenwickTree(size)
+        y_tree = DominanceMaxTree([(size - 1 - p1_index[index], p2_index[index]) for index in range(0, size)])
+        z_tree = DominanceMaxTree([(p1_index[index], p2_index[index]) for index in range(0, size)])
+
+        for id_ in p3:
+            index = index_map[id_]
+            index1, index2 = p1_index[index], p2_index[index]
+            new_pos = Vector3D(x_tree.query(size - 1 - index2),
+                               y_tree.query(size - 1 - index1, index2),
+                               z_tree.query(index1, index2))
+            module_ = self._module_map[id_]
+            # 回転したモジュールは位置が同じでも大きさを更新する
+            if id_ in self._moved_module_set \
+                    or (new_pos.x, new_pos.y, new_pos.z) != (module_.pos.x, module_.pos.y, module_.pos.z):
+                module_.set_position(new_pos, True)
+                self._moved_module_set.add(id_)
+
+            x_tree.update(size - 1 - index2, module_.pos.x + module_.width)
+            y_tree.update(size - 1 - index1, index2, module_.pos.y + module_.height)
+            z_tree.update(index1, index2, module_.pos.z + module_.depth)
+
     def create_neighborhood(self):
         """
         SA用の近傍を生成する
@@ -91,8 +147,14 @@ class SequenceTriple:
         2. shift近傍
         3. rotate近傍
         以上の3つを等確率で一つ採用
+        モジュールが1つ以下の場合は並べ替えられないため, rotate近傍のみを用いる
         """
-        strategy = random.randint(1, 3)
+        size = len(self._candidate_permutation1)
+        if size == 0:
+            self._last_rotate = 0, None
+            return
+
+        strategy = random.randint(1, 3) if size > 1 else 3
         if strategy == 1:
             self._last_rotate = self.__swap(self._candidate_permutation1,
                                             self._candidate_permutation2,
@@ -102,12 +164,12 @@ class SequenceTriple:
                                              self._candidate_permutation2,
                                              self._candidate_permutation3)
         else:
-            size = len(self._candidate_permutation1)
             index = random.randint(0, size - 1)
             id_ = self._candidate_permutation1[index]
             rotate_module = self._module_map[id_]
             rotate = self.__rotate(rotate_module)
             self._last_rotate = (index, rotate)
+            self._moved_module_set.add(id_)
 
     @staticmethod
     def __swap(p1, p2, p3):
@@ -169,71 +231,3 @@ class SequenceTriple:
                 return 'Z'
 
         return None
-
-    def __find_x(self, target_id, p2):
-        p2_list = set()
-        flag = False
-        for id_ in p2:
-            if id_ == target_id:
-                flag = True
-            if not flag:
-                continue
-            if self._placed[id_]:
-                p2_list.add(id_)
-
-        placed_module_list = p2_list
-        x = 0
-        for id_ in placed_module_list:
-            module_ = self._module_map[id_]
-            x = max(x, module_.pos.x + module_.width)
-
-        return x
-
-    def __find_y(self, target_id, p1, p2):
-        p1_list = set()
-        p2_list = set()
-        flag = False
-        for id_ in p1:
-            if id_ == target_id:
-                flag = True
-            if not flag:
-                continue
-            if self._placed[id_]:
-                p1_list.add(id_)
-
-        for id_ in p2:
-            if id_ == target_id:
-                break
-            if self._placed[id_]:
-                p2_list.add(id_)
-
-        placed_module_list = p1_list & p2_list
-        y = 0
-        for id_ in placed_module_list:
-            module_ = self._module_map[id_]
-            y = max(y, module_.pos.y + module_.height)
-
-        return y
-
-    def __find_z(self, target_id, p1, p2):
-        p1_list = set()
-        p2_list = set()
-        for id_ in p1:
-            if id_ == target_id:
-                break
-            if self._placed[id_]:
-                p1_list.add(id_)
-
-        for id_ in p2:
-            if id_ == target_id:
-                break
-            if self._placed[id_]:
-                p2_list.add(id_)
-
-        placed_module_list = p1_list & p2_list
-        z = 0
-        for id_ in placed_module_list:
-            module_ = self._module_map[id_]
-            z = max(z, module_.pos.z + module_.depth)
-
-        return z
@@ -0,0 +1,118 @@
+class TourOptimizer:
+    """
+    ネットを構成する接合部を巡回する順序を, 2-optとOr-optの局所探索で改善する
+    各近傍の評価は交換する辺の距離のみを用いて定数時間で行い, 改善する近傍が無くなるまで繰り返す
+    _invalidate_pairで結ばれた接合部(モジュール内で既に接続されている組)の間の辺は切らない
+    """
+    def __init__(self, route_list, invalidate_pair, dist_table, segment_size=3):
+        """
+        コンストラクタ
+
+        :param route_list 接合部を巡回する初期順序
+        :param invalidate_pair 既に接続されている接合部の組
+        :param dist_table 接合部の組から距離への辞書
+        :param segment_size Or-optで移動する区間の最大の長さ
+        """
+        self._route = route_list
+        self._invalidate_pair = invalidate_pair
+        self._segment_size = segment_size
+
+        size = len(route_list) if len(route_list) > 2 else 0
+        self._dist = [[0.0 if i == j else dist_table[(route_list[i], route_list[j])]
+                       for j in range(size)] for i in range(size)]
+        # 既に接続されている相手の番号. 相手がネットに含まれなければ-1
+        index_map = {(joint.x, joint.y, joint.z): index for index, joint in enumerate(route_list)}
+        self._partner = []
+        for joint in route_list:
+            partner = self._invalidate_pair.get(joint)
+            self._partner.append(-1 if partner is None else index_map.get((partner.x, partner.y, partner.z), -1))
+
+    def execute(self):
+        """
+        局所探索を行い, 接続すべき接合部の組の辞書を返す
+        """
+        if len(self._route) == 2:
+            return {self._route[0]: self._route[1]}
+
+        tour = list(range(len(self._route)))
+        while self.__two_opt(tour) or self.__or_opt(tour):
+            pass
+
+        self._route[:] = [self._route[index] for index in tour]
+        return self.create_route_pair(self._route, self._invalidate_pair)
+
+    @staticmethod
+    def create_route_pair(route, invalidate_pair):
+        """
+        巡回順序で隣り合う接合部の組のうち, 既に接続されているものを除いた辞書を返す
+
+        :param route 接合部を巡回する順序
+        :param invalidate_pair 既に接続されている接合部の組
+        """
+        size = len(route)
+        route_pair = {}
+        for index in range(0, size - 1):
+            if invalidate_pair[route[index]] == route[index + 1]:
+                continue
+            route_pair[route[index]] = route[index + 1]
+        if invalidate_pair[route[size - 1]] != route[0]:
+            route_pair[route[size - 1]] = route[0]
+
+        return route_pair
+
+    def __is_fixed(self, a, b):
+        """
+        接合部a, bの間の辺が切れない辺であればTrue
+        """
+        return self._partner[a] == b
+
+    def __two_opt(self, tour):
+        """
+        2本の辺(a, b), (c, d)を(a, c), (b, d)に張り替えて改善する近傍を1つ探して適用する
+
+        :param tour 巡回順序(接合部の番号の配列)
+        """
+        dist, size = self._dist, len(tour)
+        for i in range(size - 2):
+            a, b = tour[i], tour[i + 1]
+            if self.__is_fixed(a, b):
+                continue
+            for j in range(i + 2, size if i > 0 else size - 1):
+                c, d = tour[j], tour[(j + 1) % size]
+                if self.__is_fixed(c, d):
+                    continue
+                if dist[a][c] + dist[b][d] < dist[a][b] + dist[c][d]:
+                    tour[i + 1:j + 1] = tour[i + 1:j + 1][::-1]
+                    return True
+
+        return False
+
+    def __or_opt(self, tour):
+        """
+        長さsegment_size以下の区間を別の辺の間に(必要なら反転して)移す近傍を1つ探して適用する
+
+        :param tour 巡回順序(接合部の番号の配列)
+        """
+        dist, size = self._dist, len(tour)
+        for length in range(1, min(self._segment_size, size - 2) + 1):
+            for start in range(size):
+                segment = [tour[(start + n) % size] for n in range(length)]
+                # restは区間の次の接合部から前の接合部までを巡回順に並べたもの
+                rest = [tour[(start + length + n) % size] for n in range(size - length)]
+                first, last, next_, previous = segment[0], segment[-1], rest[0], rest[-1]
+                if self.__is_fixed(previous, first) or self.__is_fixed(last, next_):
+                    continue
+
+                gain = dist[previous][first] + dist[last][next_] - dist[previous][next_]
+                for m in range(len(rest) - 1):
+                    u, v = rest[m], rest[m + 1]
+                    if self.__is_fixed(u, v):
+                        continue
+                    forward = dist[u][first] + dist[last][v] - dist[u][v]
+                    backward = dist[u][last] + dist[first][v] - dist[u][v]
+                    if min(forward, backward) < gain:
+                        inserted = segment if forward <= backward else segment[::-1]
+                        tour[:] = rest[:m + 1] + inserted + rest[m + 1:]
+                        return True
+
+        return False
@@ -1,11 +1,30 @@
 import math
+import heapq
 
 
 class TqecEvaluator:
-    def __init__(self, module_list):
+    """
+    モジュールの交差ノードを囲む直方体の大きさで配置を評価する
+    モジュール毎の範囲と全体の最小・最大値のヒープを保持し,
+    移動したモジュールのみを再計算する差分評価にも対応する
+    """
+    def __init__(self, module_list, debug=False):
+        """
+        コンストラクタ
+
+        :param module_list Moduleの配列
+        :param debug Trueの場合は差分評価の結果を全体の再計算と照合する
+        """
         self._module_list = module_list
+        self._debug = debug
+        self._extent_map = {}
+        # x, y, zの最小値と最大値(符号反転)のヒープ. 要素は(値, モジュール番号)
+        self._heap_list = [[] for n in range(0, 6)]
 
     def evaluate(self):
+        """
+        全てのモジュールから評価値を計算し, 差分評価用の情報を作り直す
+        """
         min_x = min_y = min_z = math.inf
         max_x = max_y = max_z = -math.inf
         for module_ in self._module_list:
@@ -17,6 +36,80 @@ class TqecEvaluator:
                 max_y = max(node.y, max_y)
                 max_z = max(node.z, max_z)
 
+        self.__rebuild()
+
+        return self.__point(min_x, min_y, min_z, max_x, max_y, max_z)
+
+    def update(self, moved_module_list):
+        """
+        移動したモジュールの範囲のみを更新して評価値を計算する
+
+        :param moved_module_list 前回の評価から位置または向きが変わったModuleの配列
+        """
+        for module_ in moved_module_list:
+            extent = self.__extent(module_)
+            self._extent_map[module_.id] = extent
+            if extent is None:
+                continue
+            for index, heap in enumerate(self._heap_list):
+                heapq.heappush(heap, (extent[index], module_.id))
+
+        # 古い要素が溜まりすぎたら作り直す. 古い要素は先頭に来るまで取り除かれないため, 最も大きいヒープで判定する
+        if max(len(heap) for heap in self._heap_list) > 4 * len(self._module_list) + 16:
+            self.__rebuild()
+
+        min_x, min_y, min_z, max_x, max_y, max_z = [self.__peek(index) for index in range(0, 6)]
+        point = self.__point(min_x, min_y, min_z, -max_x, -max_y, -max_z)
+
+        if self._debug:
+            exact_point = TqecEvaluator(self._module_list).evaluate()
+            assert point == exact_point, "incremental cost {} != exact cost {}".format(point, exact_point)
+
+        return point
+
+    def __rebuild(self):
+        self._extent_map = {module_.id: self.__extent(module_) for module_ in self._module_list}
+        self._heap_list = [[(extent[index], id_) for id_, extent in self._extent_map.items() if extent is not None]
+                           for index in range(0, 6)]
+        for heap in self._heap_list:
+            heapq.heapify(heap)
+
+    def __peek(self, index):
+        """
+        index番目のヒープから現在の範囲と一致する先頭の値を返す
+        """
+        heap = self._heap_list[index]
+        while len(heap) > 0:
+            value, id_ = heap[0]
+            extent = self._extent_map[id_]
+            if extent is not None and extent[index] == value:
+                return value
+            heapq.heappop(heap)
+
+        return math.inf
+
+    @staticmethod
+    def __extent(module_):
+        """
+        モジュールの交差ノードの範囲を(min_x, min_y, min_z, -max_x, -max_y, -max_z)で返す
+        """
+        if len(module_.cross_node_list) == 0:
+            return None
+
+        min_x = min_y = min_z = math.inf
+        max_x = max_y = max_z = -math.inf
+        for node in module_.cross_node_list:
+            min_x = min(node.x, min_x)
+            min_y = min(node.y, min_y)
+            min_z = min(node.z, min_z)
+            max_x = max(node.x, max_x)
+            max_y = max(node.y, max_y)
+            max_z = max(node.z, max_z)
+
+        return min_x, min_y, min_z, -max_x, -max_y, -max_z
+
+    @staticmethod
+    def __point(min_x, min_y, min_z, max_x, max_y, max_z):
         width = (max_x - min_x) / 2 + 1
         height = (max_y - min_y) / 2 + 1
         depth = (max_z - min_z) / 2 + 1
@@ -1,12 +1,37 @@
-from collections import defaultdict
+import random
+from collections import defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
 
 from .sa import SA
+from .distance_oracle import DistanceOracle
+from .obstacle_map import ObstacleMap
+from .tour_optimizer import TourOptimizer
+
+# 別プロセスに渡す接合部の座標. 接合部と同様に座標で比較でき, DistanceOracleで距離を求められる
+JointSpec = namedtuple("JointSpec", ["x", "y", "z"])
+
+# ワーカープロセスが保持する障害物の情報
+_worker_oracle = None
 
 
 class TSP:
-    def __init__(self, graph, module_list):
+    def __init__(self, graph, module_list, time_limit=None, annealing=False, workers=1, obstacle_map=None):
+        """
+        コンストラクタ
+
+        :param graph グラフ
+        :param module_list Moduleの配列
+        :param time_limit 焼きなましの実行時間の上限(秒)
+        :param annealing ネット内の接続順序を局所探索ではなく焼きなましで求めるならTrue
+        :param workers ネットごとの接続順序を並列に求めるプロセスの数
+        :param obstacle_map 配線に利用できない点の配列. 省略した場合はgraphとmodule_listから作成する
+        """
         self._graph = graph
+        self._time_limit = time_limit
+        self._annealing = annealing
+        self._workers = workers
         self._module_list = module_list
+        self._obstacle_map = obstacle_map
         self._joint_pair_list = []
         self._end_map = {}
         self._invalidate_pair = {}
@@ -27,13 +52,98 @@ class TSP:
         for id_, joint_list in joint_map.items():
             self.__assign_target_node(id_, joint_list)
 
+        # 障害物の配列と接合部間の距離は全てのネットで共有する
+        if self._obstacle_map is None:
+            self._obstacle_map = ObstacleMap(self._graph, self._module_list)
+        oracle = DistanceOracle(self._obstacle_map)
+        # 3点以上のネットのみ順序を探索する. 焼きなましの乱数の種はネットの順に決めておく
+        net_list = [route_list for route_list in self._route_list.values() if len(route_list) > 2]
+        task_list = [(self.__create_spec(route_list), self._annealing, self._time_limit,
+                      random.getrandbits(32) if self._annealing else None)
+                     for route_list in net_list]
+
+        if self._workers <= 1 or len(task_list) <= 1:
+            order_list = [TSP._order(oracle, *task) for task in task_list]
+        else:
+            with ProcessPoolExecutor(max_workers=self._workers, initializer=TSP._init_worker,
+                                     initargs=(oracle,)) as executor:
+                order_list = list(executor.map(TSP._order_worker, task_list))
+
+        for route_list, order in zip(net_list, order_list):
+            route_list[:] = [route_list[index] for index in order]
+
+        # 結果はプロセスの数によらずネットの順に併合する
         route_pair = {}
         for route_list in self._route_list.values():
-            route = SA(self._graph, self._module_list, route_list, self._invalidate_pair).execute()
-            route_pair.update(route)
+            if len(route_list) == 2:
+                route_pair[route_list[0]] = route_list[1]
+            else:
+                route_pair.update(TourOptimizer.create_route_pair(route_list, self._invalidate_pair))
 
         return route_pair
 
+    def __create_spec(self, route_list):
+        """
+        ネットを別プロセスに渡せる形に変換する
+        接合部の座標の配列と, 既に接続されている相手の番号の配列(相手がネットに含まれなければ-1)を返す
+
+        :param route_list ネットを構成する接合部の配列
+        """
+        index_map = {joint: index for index, joint in enumerate(route_list)}
+        position_list = [(joint.x, joint.y, joint.z) for joint in route_list]
+        partner_list = [index_map.get(self._invalidate_pair[joint], -1) for joint in route_list]
+        return position_list, partner_list
+
+    @staticmethod
+    def _order(oracle, spec, annealing, time_limit, seed):
+        """
+        1つのネットの接続順序を求め, 初期順序での番号を求めた順に並べて返す
+        seedを指定した場合はその種で乱数を初期化し, 終了後に元の乱数の状態に戻す
+
+        :param oracle 距離を求めるDistanceOracle
+        :param spec 接合部の座標の配列と既に接続されている相手の番号の配列の組
+        :param annealing 焼きなましで求めるならTrue
+        :param time_limit 焼きなましの実行時間の上限(秒)
+        :param seed 乱数の種
+        """
+        position_list, partner_list = spec
+        route = [JointSpec(*position) for position in position_list]
+        invalidate_pair = {joint: route[partner] if partner >= 0 else None
+                           for joint, partner in zip(route, partner_list)}
+        index_map = {joint: index for index, joint in enumerate(route)}
+
+        state = random.getstate()
+        if seed is not None:
+            random.seed(seed)
+        try:
+            if annealing:
+                SA(None, None, route, invalidate_pair, time_limit, oracle).execute()
+            else:
+                TourOptimizer(route, invalidate_pair, oracle.distance_table(route)).execute()
+        finally:
+            random.setstate(state)
+
+        return [index_map[joint] for joint in route]
+
+    @staticmethod
+    def _init_worker(oracle):
+        """
+        ワーカープロセスの初期化. 障害物の情報を1度だけ受け取って保持する
+
+        :param oracle 距離を求めるDistanceOracle
+        """
+        global _worker_oracle
+        _worker_oracle = oracle
+
+    @staticmethod
+    def _order_worker(task):
+        """
+        ワーカープロセスで1つのネットの接続順序を求める
+
+        :param task _orderの引数のうちoracle以外の組
+        """
+        return TSP._order(_worker_oracle, *task)
+
     def __assign_target_node(self, id_, joint_list):
         if len(joint_list) == 2:
             self._route_list[id_].append(joint_list[0])
@@ -1,3 +1,5 @@
+import heapq
+
 from .loop import Loop
 
 from ..graph import Node
@@ -16,44 +18,87 @@ class Transformation:
         """
         self._graph = graph
         self._var_node_count = graph.var_node_count
-        self._loop_list = []
+        self._loop_map = {}
+        self._updated_loop_set = set()
+        self._injector_updated_set = set()
+        self._rule_count = {}
 
         # 閉じていない辺を削除
         self.__delete_loop(0)
         self.__create_loop()
 
+    @property
+    def rule_count(self):
+        return self._rule_count
+
     def execute(self):
-        reduction = True
-        no = 1
-        # while reduction:
-        #     for loop in self._loop_list:
-        #         reduction = self.__rule3(loop)
-        #         if reduction:
-        #             no += 1
-        #             break
-        #
-        # reduction = True
-        # no = 1
-        # while reduction:
-        #     for loop in self._loop_list:
-        #         reduction = self.__rule2(loop)
-        #         if reduction:
-        #             no += 1
-        #             break
-        #
-        # reduction = True
-        # no = 1
-        # while reduction:
-        #     for loop in self._loop_list:
-        #         reduction = self.__rule1(loop)
-        #         if reduction:
-        #             no += 1
-        #             break
-        #
-        # self.__color_loop()
-        #
-        # print("non topological deforming is completed")
-        return self._loop_list
+        """
+        変形規則3, 2, 1の順に, それぞれ適用できなくなるまで適用する
+
+        :return 変形後のループのリスト
+        """
+        self._rule_count["rule3"] = self.__apply_rule(self.__rule3)
+        self._rule_count["rule2"] = self.__apply_rule(self.__rule2)
+        self._rule_count["rule1"] = self.__apply_rule(self.__rule1)
+
+        self.__color_loop()
+
+        print("non topological deforming is completed")
+        print("rule3: {} rule2: {} rule1: {}".format(self._rule_count["rule3"],
+                                                     self._rule_count["rule2"],
+                                                     self._rule_count["rule1"]))
+        return list(self._loop_map.values())
+
+    def __apply_rule(self, rule):
+        """
+        変形規則ruleを不動点に達するまで適用する
+        ループ番号の小さい順に調べ, 規則の適用によって交差情報または
+        injectorが変化したループのみを再度調べる
+
+        :param rule 変形規則
+        :return 規則を適用した回数
+        """
+        count = 0
+        queue = list(self._loop_map.keys())
+        heapq.heapify(queue)
+        queued = set(queue)
+        while len(queue) > 0:
+            loop_id = heapq.heappop(queue)
+            queued.remove(loop_id)
+            loop = self.__loop(loop_id)
+            if loop is None:
+                continue
+
+            self._updated_loop_set.clear()
+            self._injector_updated_set.clear()
+            if not rule(loop):
+                continue
+            count += 1
+
+            # 規則3は交差したループのinjectorも参照するため, その交差先も調べ直す
+            candidate_set = set(self._updated_loop_set)
+            for updated_id in self._injector_updated_set:
+                updated_loop = self.__loop(updated_id)
+                if updated_loop is not None:
+                    candidate_set.update(updated_loop.cross_list)
+
+            for candidate_id in candidate_set:
+                if candidate_id in self._loop_map and candidate_id not in queued:
+                    heapq.heappush(queue, candidate_id)
+                    queued.add(candidate_id)
+
+        return count
+
+    def __mark_updated(self, loop, injector=False):
+        """
+        規則の適用によって交差情報またはinjectorが変化したループを記録する
+
+        :param loop 変化したループ
+        :param injector injectorが変化した場合はTrue
+        """
+        self._updated_loop_set.add(loop.id)
+        if injector:
+            self._injector_updated_set.add(loop.id)
 
     def __create_loop(self):
         """
@@ -61,21 +106,22 @@ class Transformation:
         """
         # 辺の追加
         for loop_id in range(1, self._graph.loop_count + 1):
-            loop = Loop(loop_id)
+            edge_list = self._graph.loop_edge_list(loop_id)
+            if len(edge_list) == 0:
+                continue
 
             # ループを構成している辺を追加する
-            for edge in self._graph.edge_list:
-                if edge.id == loop_id:
-                    if edge.is_injector():
-                        loop.add_injector(edge)
-                    loop.add_edge(edge)
-                    # 交差情報の更新
-                    for cross_edge in edge.cross_edge_list:
-                        loop.add_cross(cross_edge.id)
-
-            if len(loop.edge_list) > 0:
-                loop.update()
-                self._loop_list.append(loop)
+            loop = Loop(loop_id)
+            for edge in edge_list:
+                if edge.is_injector():
+                    loop.add_injector(edge)
+                loop.add_edge(edge)
+                # 交差情報の更新
+                for cross_edge in edge.cross_edge_list:
+                    loop.add_cross(cross_edge.id)
+
+            loop.update()
+            self._loop_map[loop_id] = loop
 
     def __rule1(self, loop):
         """
@@ -87,6 +133,7 @@ class Transformation:
         cross_loop = self.__loop(loop.cross_list[0])
         cross_loop.shift_injector(loop.injector_list[0].category)
         cross_loop.remove_cross(loop.id)
+        self.__mark_updated(cross_loop, True)
         self.__delete_loop(loop.id)
 
         return True
@@ -109,6 +156,7 @@ class Transformation:
         for cross_loop_id in loop.cross_list:
             cross_loop = self.__loop(cross_loop_id)
             cross_loop.remove_cross(delete_loop_id)
+            self.__mark_updated(cross_loop)
             cross_loop_list.append(cross_loop)
         self.__delete_loop(delete_loop_id)
 
@@ -150,6 +198,7 @@ class Transformation:
         # loop1と公差しているloopからloop1の公差情報を削除
         for cross_loop in cross_loop_list:
             cross_loop.remove_cross(loop.id)
+            self.__mark_updated(cross_loop)
 
         # loop2に交差したshift_loopsをloop3, loop4...と公差させる
         for shift_id in delete_loop.cross_list:
@@ -157,11 +206,13 @@ class Transformation:
                 continue
             shift_loop = self.__loop(shift_id)
             shift_loop.remove_cross(delete_loop.id)
+            self.__mark_updated(shift_loop)
             for cross_loop in cross_loop_list:
                 if cross_loop.id == delete_loop.id:
                     continue
                 cross_loop.add_cross(shift_id)
                 shift_loop.add_cross(cross_loop.id)
+                self.__mark_updated(cross_loop)
 
         # loop1, loop2を削除
         self.__delete_loop(loop.id)
@@ -177,19 +228,22 @@ class Transformation:
         :param loop2 吸収される側のループ
         """
         for edge in loop2.edge_list:
-            edge.set_id(loop1.id)
+            self._graph.set_edge_id(edge, loop1.id)
             loop1.add_edge(edge)
 
         for cross_id in loop2.cross_list:
             # loop1にloop2が交差していたloop idを追加する
             loop1.add_cross(cross_id)
+            self.__mark_updated(loop1)
             # loop2に交差していたloopのloop2.idをloop1.idに変更する
             loop = self.__loop(cross_id)
             loop.remove_cross(loop2.id)
             loop.add_cross(loop1.id)
+            self.__mark_updated(loop)
 
         for injector in loop2.injector_list:
             loop1.add_injector(injector)
+            self.__mark_updated(loop1, True)
 
         self.__delete_loop(loop2.id, True)
 
@@ -199,13 +253,9 @@ class Transformation:
 
         :param del_edge 削除する辺
         """
-        del_edge_index = -1
-        for no, edge in enumerate(self._graph.edge_list):
-            if del_edge == edge:
-                del_edge_index = no
-
-        if del_edge_index > -1:
-            del self._graph.edge_list[del_edge_index]
+        del_edge = self._graph.edge(del_edge.x, del_edge.y, del_edge.z)
+        if del_edge is not None:
+            self._graph.remove_edge(del_edge)
 
     def __delete_loop(self, loop_id, only_loop=False):
         """
@@ -215,40 +265,29 @@ class Transformation:
         :param loop_id 削除するループ番号
         :param only_loop グラフ情報を残す場合はTrue, 全て消す場合は引数を省略
         """
-        non_loop_edge_index = []
-        non_loop_node_index = []
-        for no, edge in enumerate(self._graph.edge_list):
-            if edge.id == loop_id:
-                non_loop_edge_index.append(no)
-                (node1, node2) = (edge.node1, edge.node2)
-                non_loop_node_index.append(self._graph.node_list.index(node1))
-                non_loop_node_index.append(self._graph.node_list.index(node2))
-
-        non_loop_edge_index.reverse()
-        # 重複した要素を取り除く
-        non_loop_node_index = list(set(non_loop_node_index))
-        non_loop_node_index.sort()
-        non_loop_node_index.reverse()
-
         if not only_loop:
+            non_loop_node_map = {}
             # delete edge
-            for index in non_loop_edge_index:
-                del self._graph.edge_list[index]
+            for edge in self._graph.loop_edge_list(loop_id):
+                self._graph.remove_edge(edge)
+                (node1, node2) = (edge.node1, edge.node2)
+                # 重複した要素を取り除く
+                non_loop_node_map.setdefault(node1, node1)
+                non_loop_node_map.setdefault(node2, node2)
 
             # delete node
-            for index in non_loop_node_index:
+            for node in non_loop_node_map.values():
                 # loop_idが0の場合は、injectorが付いたノードは削除しない
                 has_injector = False
-                for edge in self._graph.node_list[index].edge_list:
+                for edge in node.edge_list:
                     if edge.is_injector() and loop_id == 0:
                         has_injector = True
                 if not has_injector:
-                    del self._graph.node_list[index]
+                    self._graph.remove_node(node)
 
         # delete loop
         if loop_id > 0:
-            loop_index = self._loop_list.index(self.__loop(loop_id))
-            del self._loop_list[loop_index]
+            del self._loop_map[loop_id]
 
     def __new_node_variable(self):
         self._var_node_count += 1
@@ -258,7 +297,7 @@ class Transformation:
         """
         ループに色付けをして可視化する
         """
-        for loop in self._loop_list:
+        for loop in self._loop_map.values():
             id_ = loop.id
             color = self.__generate_random_color(id_)
             for edge in loop.edge_list:
@@ -267,9 +306,7 @@ class Transformation:
                 edge.node2.set_color(color)
 
     def __loop(self, loop_id):
-        for loop in self._loop_list:
-            if loop.id == loop_id:
-                return loop
+        return self._loop_map.get(loop_id)
 
     def __new_node(self, type_, x, y, z):
         node = Node(x, y, z, self.__new_node_variable(), type_)